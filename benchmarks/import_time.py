@@ -0,0 +1,84 @@
+"""Measure how long `import main` and argument parsing take in a fresh interpreter.
+
+    python benchmarks/import_time.py [--runs 5] [--output import_time.json]
+
+Each run starts a new `python -X importtime` process in src/, so nothing is
+warm. The best of `--runs` is compared against benchmarks/thresholds.json and
+the script exits 1 when a threshold is exceeded.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+THRESHOLDS = os.path.join(HERE, "thresholds.json")
+
+PROBE = (
+    "import time; started = time.perf_counter(); import main; imported = time.perf_counter(); "
+    "main.parse_args(['--sequential']); parsed = time.perf_counter(); "
+    "print('PROBE', imported - started, parsed - imported)"
+)
+IMPORT_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure():
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=SRC,
+                               capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "probe failed")
+    probe = [line for line in completed.stdout.splitlines() if line.startswith("PROBE")][-1].split()
+    imports = {}
+    for match in IMPORT_LINE.finditer(completed.stderr):
+        imports[match.group(4)] = int(match.group(2)) / 1_000_000
+    return {
+        "import_main_seconds": float(probe[1]),
+        "parse_args_seconds": float(probe[2]),
+        "process_seconds": wall,
+        "imports": imports,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="how many of the slowest imports to list")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    runs = [measure() for _ in range(args.runs)]
+    best = min(runs, key=lambda run: run["import_main_seconds"])
+    with open(THRESHOLDS) as thresholds_file:
+        thresholds = json.load(thresholds_file)
+    results = {
+        "runs": args.runs,
+        "import_main_seconds": best["import_main_seconds"],
+        "parse_args_seconds": min(run["parse_args_seconds"] for run in runs),
+        "process_seconds": min(run["process_seconds"] for run in runs),
+        "top_imports": sorted(best["imports"].items(), key=lambda item: item[1], reverse=True)[:args.top],
+    }
+    results["regressions"] = {name: {"measured": results[name], "threshold": limit}
+                              for name, limit in thresholds.items() if name in results and results[name] > limit}
+
+    print(f"import main  {results['import_main_seconds'] * 1000:8.1f} ms")
+    print(f"parse_args   {results['parse_args_seconds'] * 1000:8.1f} ms")
+    print(f"process      {results['process_seconds'] * 1000:8.1f} ms")
+    print("slowest imports (cumulative):")
+    for name, seconds in results["top_imports"]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    for name, regression in results["regressions"].items():
+        print(f"REGRESSION {name}: {regression['measured']:.3f}s > {regression['threshold']:.3f}s")
+    return 1 if results["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
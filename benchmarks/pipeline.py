@@ -0,0 +1,222 @@
+"""End-to-end pipeline benchmark against the deterministic fake model (src/fake_llm.py).
+
+    python benchmarks/pipeline.py [--sizes 1,10,100] [--latency 0.01] [--words 200] [--output pipeline.json]
+
+Every size runs in its own interpreter through `main.main(["--batch", ...])`,
+with all LLM calls answered by FakeChatModel, so no network or API key is
+needed and the numbers only move when our code does. Per size it reports
+total wall time, orchestration overhead per task (task wall time minus the
+time spent inside model calls), the cost of callback logging and peak memory.
+Results are compared against benchmarks/thresholds.json; the script exits 1
+on a regression.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), "src")
+THRESHOLDS = os.path.join(HERE, "thresholds.json")
+
+
+def concepts(count):
+    return [f"Benchmark concept {index}: a lighthouse keeper who collects lost radio signals" for index in range(count)]
+
+
+def run_reports(runs_dir):
+    for run_id in sorted(os.listdir(runs_dir)):
+        path = os.path.join(runs_dir, run_id, "metrics.json")
+        if os.path.exists(path):
+            with open(path) as metrics_file:
+                yield json.load(metrics_file)
+
+
+def task_overheads(reports):
+    """{task: [seconds outside model calls, ...]} from every run's metrics.json."""
+    overheads = {}
+    for report in reports:
+        for task, seconds in (report.get("task_seconds") or {}).items():
+            llm_seconds = report["tasks"].get(task, {}).get("wall_seconds", 0.0)
+            overheads.setdefault(task, []).append(max(0.0, seconds - llm_seconds))
+    return overheads
+
+
+def prompt_cache_totals(reports):
+    totals = {"hits": 0, "misses": 0, "cache_read_tokens": 0, "input_tokens": 0, "cost_usd": 0.0, "saved_usd": 0.0}
+    call_seconds = []
+    for report in reports:
+        total = report["total"]
+        totals["hits"] += total.get("cache_hits", 0)
+        totals["misses"] += total.get("cache_misses", 0)
+        totals["cache_read_tokens"] += total.get("cache_read_tokens", 0)
+        totals["input_tokens"] += total["input_tokens"]
+        totals["cost_usd"] += total["cost_usd"]
+        totals["saved_usd"] += total.get("cache_saved_usd", 0.0)
+        call_seconds += [call["wall_seconds"] for call in report["calls"]]
+    totals["cost_usd"] = round(totals["cost_usd"], 4)
+    totals["saved_usd"] = round(totals["saved_usd"], 4)
+    totals["mean_call_seconds"] = round(sum(call_seconds) / len(call_seconds), 4) if call_seconds else None
+    return totals
+
+
+def child(args):
+    """Run one batch in this process and write its measurements to args.child_output."""
+    workdir = tempfile.mkdtemp(prefix="saga-bench-")
+    os.environ.update({
+        "SAGA_FAKE_LLM": f"latency={args.latency},prefill={args.prefill},words={args.words},"
+                         f"scenes={args.scenes if args.scene_draft else 0},cache={0 if args.no_prompt_cache else 1}",
+        "SAGA_RUNS_DIR": os.path.join(workdir, "runs"),
+        "CALLBACK_LOG_PATH": os.path.join(workdir, "callbacks.jsonl"),
+        "LLM_CACHE_MODE": "off",
+        "SAGA_STREAM": "0",
+    })
+    if not args.rate_limits:
+        os.environ["SAGA_RATE_LIMITS"] = "off"
+    os.environ.pop("EXA_API_KEY", None)
+    sys.path.insert(0, SRC)
+    os.chdir(workdir)
+
+    concepts_path = os.path.join(workdir, "concepts.txt")
+    with open(concepts_path, "w") as concepts_file:
+        concepts_file.write("\n".join(concepts(args.child)) + "\n")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    import main
+    from utils import callback_logger
+
+    # Time what agents pay for each log() call; the writer thread is timed separately by the final flush
+    logged = {"records": 0, "seconds": 0.0}
+    log = callback_logger.log
+
+    def timed_log(record):
+        started = time.perf_counter()
+        log(record)
+        logged["seconds"] += time.perf_counter() - started
+        logged["records"] += 1
+
+    callback_logger.log = timed_log
+
+    started = time.perf_counter()
+    with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+        main.main(["--batch", concepts_path, "--workers", str(args.workers),
+                   "--results", os.path.join(workdir, "results.jsonl"),
+                   "--sink", "jsonl", "--output", os.path.join(workdir, "scripts.jsonl")]
+                  + (["--scene-draft"] if args.scene_draft else []))
+    wall = time.perf_counter() - started
+    flush_started = time.perf_counter()
+    callback_logger.flush()
+    flush_seconds = time.perf_counter() - flush_started
+
+    with open(os.path.join(workdir, "results.jsonl")) as results_file:
+        records = [json.loads(line) for line in results_file]
+    reports = list(run_reports(os.environ["SAGA_RUNS_DIR"]))
+    overheads = task_overheads(reports)
+    all_overheads = [seconds for values in overheads.values() for seconds in values]
+    result = {
+        "concepts": args.child,
+        "succeeded": sum(1 for record in records if record["status"] == "ok"),
+        "errors": sorted({record["error"] for record in records if record["status"] != "ok"})[:5],
+        "wall_seconds": round(wall, 3),
+        "concepts_per_minute": round(args.child / wall * 60, 2) if wall else 0.0,
+        "overhead_seconds_per_task": round(sum(all_overheads) / len(all_overheads), 4) if all_overheads else None,
+        "overhead_by_task": {task: round(sum(values) / len(values), 4) for task, values in sorted(overheads.items())},
+        "logging": {
+            "records": logged["records"],
+            "dropped": callback_logger.dropped,
+            "caller_seconds": round(logged["seconds"], 4),
+            "us_per_record": round(logged["seconds"] / logged["records"] * 1e6, 2) if logged["records"] else None,
+            "flush_seconds": round(flush_seconds, 4),
+        },
+        "prompt_cache": prompt_cache_totals(reports),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if args.tracemalloc:
+        result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+    with open(args.child_output, "w") as output_file:
+        json.dump(result, output_file)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def regressions(results, thresholds):
+    found = {}
+    for size in results["sizes"]:
+        checks = {
+            "pipeline_overhead_seconds_per_task": size["overhead_seconds_per_task"],
+            "pipeline_logging_us_per_record": size["logging"]["us_per_record"],
+            "pipeline_peak_rss_mb": size["peak_rss_mb"],
+        }
+        for name, measured in checks.items():
+            limit = thresholds.get(name)
+            if limit is not None and measured is not None and measured > limit:
+                found[f"{name}[{size['concepts']}]"] = {"measured": measured, "threshold": limit}
+        if size["succeeded"] < size["concepts"]:
+            found[f"pipeline_failures[{size['concepts']}]"] = {"measured": size["concepts"] - size["succeeded"],
+                                                              "threshold": 0}
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1,10,100", help="comma separated batch sizes")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds per fake model call")
+    parser.add_argument("--words", type=int, default=200, help="words per fake model answer")
+    parser.add_argument("--prefill", type=float, default=0.0,
+                        help="extra seconds per 1000 uncached prompt tokens, to see prompt caching in wall time")
+    parser.add_argument("--scene-draft", action="store_true", help="run with --scene-draft")
+    parser.add_argument("--scenes", type=int, default=4, help="scenes per fake model answer, for --scene-draft")
+    parser.add_argument("--no-prompt-cache", action="store_true", help="disable the simulated provider prompt cache")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the default per-model rate limits")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report the traced Python heap peak")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        child(args)
+        return 0
+
+    results = {"latency": args.latency, "prefill": args.prefill, "words": args.words, "workers": args.workers,
+               "prompt_cache": not args.no_prompt_cache, "scene_draft": args.scene_draft, "sizes": []}
+    for size in (int(size) for size in args.sizes.split(",")):
+        with tempfile.NamedTemporaryFile(suffix=".json") as child_output:
+            command = [sys.executable, os.path.abspath(__file__), "--child", str(size),
+                       "--child-output", child_output.name, "--workers", str(args.workers),
+                       "--latency", str(args.latency), "--words", str(args.words), "--prefill", str(args.prefill)]
+            command += ["--no-prompt-cache"] if args.no_prompt_cache else []
+            command += ["--scene-draft", "--scenes", str(args.scenes)] if args.scene_draft else []
+            command += ["--rate-limits"] if args.rate_limits else []
+            command += ["--tracemalloc"] if args.tracemalloc else []
+            subprocess.run(command, check=True)
+            with open(child_output.name) as output_file:
+                measured = json.load(output_file)
+        results["sizes"].append(measured)
+        print(f"{size:4d} concepts  {measured['wall_seconds']:8.2f}s wall  "
+              f"{measured['concepts_per_minute']:8.1f}/min  "
+              f"overhead {measured['overhead_seconds_per_task']}s/task  "
+              f"logging {measured['logging']['us_per_record']}us/record  "
+              f"prompt cache {measured['prompt_cache']['hits']} hits/{measured['prompt_cache']['misses']} misses  "
+              f"peak {measured['peak_rss_mb']}MB  ok {measured['succeeded']}/{size}")
+
+    with open(THRESHOLDS) as thresholds_file:
+        results["regressions"] = regressions(results, json.load(thresholds_file))
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+    for name, regression in results["regressions"].items():
+        print(f"REGRESSION {name}: {regression['measured']} > {regression['threshold']}")
+    return 1 if results["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
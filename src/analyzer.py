@@ -0,0 +1,209 @@
+import re
+import sys
+from typing import List, NamedTuple, Optional
+
+WORDS_PER_MINUTE = 150
+LENGTH_TOLERANCE = 0.15
+
+NARRATOR_LABELS = {"narrator", "narration", "voiceover", "voice over", "voice-over", "vo", "v.o."}
+CUE_LABELS = {"visual", "visuals", "visual cue", "shot", "shots", "camera", "b-roll", "broll", "footage", "image",
+              "graphic", "graphics", "animation", "scene", "setting", "sfx", "sound", "sound effect", "sound effects",
+              "music", "audio", "cut to", "cut", "fade in", "fade out", "fade to black", "dissolve to", "transition"}
+# Common words that open a narration line with a colon, never a character's name
+NOT_SPEAKERS = {"note", "remember", "why", "how", "what", "who", "when", "where", "tip", "warning", "important",
+                "fact", "question", "answer", "lesson", "moral", "hint", "reminder", "summary", "conclusion",
+                "example", "bonus", "update", "rule", "takeaway", "key takeaway", "the point", "spoiler"}
+# Sections the script task may append after the script; they are not spoken
+SUPPLEMENT = re.compile(r"^(?:(?:author|writer)(?:'?s|s')? notes?|notes|production notes|research references|references|"
+                        r"sources|citations|character profiles?|supplementary materials?|summary of changes|"
+                        r"changes made|revision notes|rationale)$", re.I)
+NARRATOR_TAG = re.compile(r"\((?:narrator|v\.?\s?o\.?)\)|^v\.?\s?o\.?\s*:", re.I)
+HEADING = re.compile(r"^\s*(?:#{1,6}\s+.*|(?:\*\*)?\s*(?:scene|section)\s*\d+\b.*|\*\*[^*]+\*\*:?|-{3,}|={3,})\s*$",
+                     re.I)
+CUE = re.compile(r"\[[^\]]*\]|\((?![^)]*\b(?:narrator|v\.?o\.?)\b)[^)]*\)", re.I)
+SPEAKER = re.compile(r"^\s*(?:\*\*)?([A-Z][\w .'’-]{0,40}?)(?:\*\*)?\s*(?:\([^)]*\))?\s*:(?:\*\*)?\s*(.*)$")
+QUOTED = re.compile(r"[\"“”]\S+(?:\s+\S+){3,}[\"“”]")  # four words or more, not a quoted name
+SCREEN_TEXT_LABEL = re.compile(r"^(?:on-?screen text|text on screen|text|caption|title|title card|subtitle|super)$",
+                               re.I)
+TEXT_ON_SCREEN = re.compile(
+    r"\b(?:text on screen|on-?screen text|caption|subtitle|title card|headline|lower third|"
+    r"(?:screen|words?|text) (?:reads|says|displays|spells)|types? out|letter by letter)\b", re.I)
+
+
+class Line(NamedTuple):
+    kind: str  # narration, cue, speaker, screen_text, heading or supplement
+    text: str
+    paragraph: int  # 1-based, as numbered by revision.split_paragraphs
+    speaker: Optional[str] = None
+
+
+class Violation(NamedTuple):
+    rule: str
+    message: str
+    paragraph: Optional[int] = None
+    text: str = ""
+
+
+class ScriptAnalysis():
+    """A script split into narration, visual cues and speaker lines, with the rules it breaks."""
+
+    def __init__(self, lines, violations, words, seconds, target_words):
+        self.lines = lines
+        self.violations = violations
+        self.words = words
+        self.seconds = seconds
+        self.target_words = target_words
+
+    @property
+    def ok(self):
+        return not self.violations
+
+    def of_kind(self, kind):
+        return [line for line in self.lines if line.kind == kind]
+
+    def summary(self):
+        return {
+            "narration_lines": len(self.of_kind("narration")),
+            "cues": len(self.of_kind("cue")),
+            "speaker_lines": len(self.of_kind("speaker")),
+            "supplement_lines": len(self.of_kind("supplement")),
+            "words": self.words,
+            "target_words": self.target_words,
+            "seconds": round(self.seconds, 1),
+            "violations": [violation._asdict() for violation in self.violations],
+        }
+
+
+def _paragraphs(script):
+    return [paragraph.strip() for paragraph in re.split(r"\n\s*\n", (script or "").strip()) if paragraph.strip()]
+
+
+def _is_name(label):
+    """"Programmer", "OLD MAN", "Dr. Reyes" - not "The truth is simple" from a narration line with a colon."""
+    words = label.split()
+    return len(words) <= 3 and all(word[0].isupper() or not word[0].isalpha() for word in words)
+
+
+def classify(script):
+    """Every non-empty line of `script` as a Line; inline cues are split out of narration.
+
+    Labelled lines are checked against the screen-text, cue ("VISUAL:",
+    "SFX:", "FADE IN:") and narrator labels before a label counts as a
+    character speaking. A cue label on a line of its own makes the rest of
+    its paragraph, up to the next label, cue text; any other label on a
+    line of its own is a heading. Lines under an "Author Notes:" or
+    "Research References" heading, up to the next other heading, are a
+    supplement, not part of the script.
+    """
+    lines = []
+    in_supplement = False
+    for number, paragraph in enumerate(_paragraphs(script), 1):
+        in_cue = False
+        for raw in paragraph.splitlines():
+            raw = raw.strip()
+            if not raw:
+                continue
+            speaker = SPEAKER.match(raw)
+            if HEADING.match(raw) or (speaker and not speaker.group(2).strip()):
+                # A heading opens a supplement section or, after one, ends it
+                in_supplement = bool(SUPPLEMENT.match(raw.strip("#*_: \t")))
+            if in_supplement:
+                lines.append(Line("supplement", raw, number))
+                continue
+            if HEADING.match(raw):
+                lines.append(Line("heading", raw, number))
+                continue
+            text = raw
+            if speaker:
+                name = speaker.group(1).strip()
+                label = name.lower().rstrip(".")
+                in_cue = False
+                if SCREEN_TEXT_LABEL.match(name):
+                    lines.append(Line("screen_text", raw, number))
+                    continue
+                if label in CUE_LABELS:
+                    lines.append(Line("cue", raw, number))
+                    in_cue = not speaker.group(2).strip()
+                    continue
+                if name.lower() in NARRATOR_LABELS:
+                    text = speaker.group(2).strip()
+                elif not speaker.group(2).strip():
+                    lines.append(Line("heading", raw, number))
+                    continue
+                elif _is_name(name) and label not in NOT_SPEAKERS:
+                    lines.append(Line("speaker", raw, number, name))
+                    continue
+            elif in_cue:
+                lines.append(Line("cue", raw, number))
+                continue
+            text = NARRATOR_TAG.sub(" ", text).strip()
+            for cue in CUE.findall(text):
+                lines.append(Line("cue", cue, number))
+            narration = CUE.sub(" ", text).strip(" -*_")
+            if re.search(r"\w", narration):
+                lines.append(Line("narration", " ".join(narration.split()), number))
+    return lines
+
+
+def analyze(script, target_words=600, target_seconds=None, wpm=WORDS_PER_MINUTE, tolerance=LENGTH_TOLERANCE,
+            cta=None):
+    """Check a script against the mechanical YouTube requirements without calling a model.
+
+    Narration words are counted at `wpm` to estimate the spoken duration,
+    which has to land within `tolerance` of the target. Speaker lines other
+    than the narrator's, text meant to appear on screen and scripts without
+    visual cues are violations, and so is a missing `cta` if one is given.
+    """
+    lines = classify(script)
+    narration = [line for line in lines if line.kind == "narration"]
+    words = sum(len(line.text.split()) for line in narration)
+    seconds = words / wpm * 60
+    target_seconds = target_seconds or target_words / wpm * 60
+    violations = []
+
+    spoken = f"{words} narration words is ~{seconds:.0f}s spoken"
+    if seconds > target_seconds * (1 + tolerance):
+        violations.append(Violation("too_long", f"{spoken}, cut about {words - target_words} words "
+                                                f"to reach {target_seconds:.0f}s"))
+    elif seconds < target_seconds * (1 - tolerance):
+        violations.append(Violation("too_short", f"{spoken}, add about {target_words - words} words "
+                                                 f"to reach {target_seconds:.0f}s"))
+    for line in lines:
+        if line.kind == "speaker":
+            violations.append(Violation("dialogue", f"{line.speaker} speaks; only the narrator may talk",
+                                        line.paragraph, line.text))
+        elif line.kind == "screen_text" or (
+                line.kind == "cue" and (QUOTED.search(line.text) or TEXT_ON_SCREEN.search(line.text))):
+            violations.append(Violation("text_on_screen", "visual cue puts text on screen",
+                                        line.paragraph, line.text))
+    if narration and not any(line.kind == "cue" for line in lines):
+        violations.append(Violation("no_visual_cues", "no [visual cue] anywhere in the script"))
+    if cta and _normalize(cta.split("?")[0]) not in _normalize(" ".join(line.text for line in narration)):
+        violations.append(Violation("missing_cta", f"the narration never delivers the call to action: {cta}"))
+    return ScriptAnalysis(lines, violations, words, seconds, target_words)
+
+
+def _normalize(text):
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower().replace("’", "'")))
+
+
+def report(analysis: ScriptAnalysis) -> List[str]:
+    summary = analysis.summary()
+    lines = [f"{summary['words']} narration words (~{summary['seconds']}s), {summary['cues']} visual cues, "
+             f"{summary['speaker_lines']} speaker lines"]
+    for violation in analysis.violations:
+        where = f" [P{violation.paragraph}]" if violation.paragraph else ""
+        quoted = f" -- {violation.text}" if violation.text else ""
+        lines.append(f"  {violation.rule}{where}: {violation.message}{quoted}")
+    return lines
+
+
+if __name__ == "__main__":
+    failed = False
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as script_file:
+            analysis = analyze(script_file.read())
+        print(path)
+        print("\n".join(report(analysis)))
+        failed = failed or not analysis.ok
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,231 @@
+import threading
+import time
+from collections import deque
+
+from llms import ALIASES
+from ratelimit import DEFAULT_LIMITS
+from router import TASK_POLICIES
+
+DEFAULT_POOL_SIZE = 4
+
+
+def stage_models():
+    """{stage: model} from the router's per-task preferences, in pipeline order."""
+    return {name: policy.prefer for name, policy in TASK_POLICIES.items()}
+
+
+def parse_pools(spec):
+    """{model: workers} from "ClaudeHaiku=8,claude-3-opus=4"; aliases from llms.ALIASES are accepted."""
+    pools = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, size = part.partition("=")
+        try:
+            size = int(size)
+        except ValueError:
+            raise ValueError(f"Pool size of {name.strip()!r} must be a whole number, got {size!r}") from None
+        if size < 1:
+            raise ValueError(f"Pool {name.strip()!r} needs at least one worker, got {size}")
+        pools[ALIASES.get(name.strip(), name.strip())] = size
+    return pools
+
+
+def percentiles(values, points=(50, 90, 99)):
+    values = sorted(values)
+    if not values:
+        return {f"p{point}": None for point in points}
+    return {f"p{point}": round(values[min(len(values) - 1, int(point / 100 * len(values)))], 3) for point in points}
+
+
+class _Job():
+    def __init__(self, item, graph):
+        self.item = item
+        self.graph = graph
+        self.admitted = time.monotonic()
+        self.remaining = {name: set(deps) for name, deps in graph.dependencies.items()}
+        self.outstanding = 0  # tasks queued or running
+        self.error = None
+
+
+class AssemblyLine():
+    """Runs many TaskGraphs stage by stage, every stage a queue served by its model's worker pool.
+
+    Each stage (imagine, research, ...) is served by the pool of the model
+    the router prefers for it, sized by `pools` (default: the model's
+    concurrency in ratelimit.DEFAULT_LIMITS). A pool's workers take the most
+    downstream stage with work first, so concepts already in flight finish
+    before new ones move up the line. At most `max_in_flight` concepts are
+    admitted at once.
+    """
+
+    def __init__(self, pools=None, models=None, max_in_flight=None):
+        self.models = dict(models or stage_models())
+        self.pools = {model: DEFAULT_LIMITS.get(model, (0, 0, DEFAULT_POOL_SIZE))[2]
+                      for model in self.models.values()}
+        self.pools.update(pools or {})
+        idle = sorted({model for model in self.models.values() if self.pools.get(model, 0) < 1})
+        if idle:
+            # Their stages would queue work that no one ever picks up
+            stages = sorted(stage for stage, model in self.models.items() if model in idle)
+            raise ValueError(f"No workers for {idle}, which serve the stages {stages}")
+        self.max_in_flight = max_in_flight or 2 * sum(self.pools.values())
+        self._cond = threading.Condition()
+        self._queues = {stage: deque() for stage in self.models}
+        self._depth = {stage: {"max": 0, "area": 0.0, "changed": None} for stage in self.models}
+        self._waits = {stage: [] for stage in self.models}
+        self._service = {stage: [] for stage in self.models}
+        self._busy = {model: 0.0 for model in self.pools}
+        self._done = deque()
+        self._closed = False
+        self._started = time.monotonic()
+        self.in_flight = 0
+        self.latencies = []
+        self.failed = 0
+
+    def _enqueue(self, job, stage):
+        self._account(stage)
+        job.outstanding += 1
+        self._queues[stage].append((job, time.monotonic()))
+        self._depth[stage]["max"] = max(self._depth[stage]["max"], len(self._queues[stage]))
+        self._cond.notify_all()
+
+    def _account(self, stage):
+        """Add the time spent at the current depth to the stage's depth-seconds before it changes."""
+        now = time.monotonic()
+        depth = self._depth[stage]
+        if depth["changed"] is not None:
+            depth["area"] += len(self._queues[stage]) * (now - depth["changed"])
+        depth["changed"] = now
+
+    def _admit(self, item, graph):
+        unknown = set(graph.tasks) - set(self.models)
+        if unknown:
+            raise ValueError(f"No worker pool serves the stages {sorted(unknown)}")
+        job = _Job(item, graph)
+        with self._cond:
+            self.in_flight += 1
+            for name in [name for name, deps in job.remaining.items() if not deps]:
+                del job.remaining[name]
+                self._enqueue(job, name)
+
+    def _next(self, stages):
+        while not self._closed:
+            stage = next((stage for stage in stages if self._queues[stage]), None)
+            if stage is not None:
+                return stage
+            self._cond.wait()
+        return None
+
+    def _work(self, model):
+        stages = [stage for stage in reversed(list(self.models)) if self.models[stage] == model]
+        while True:
+            with self._cond:
+                stage = self._next(stages)
+                if stage is None:
+                    return
+                self._account(stage)
+                job, queued = self._queues[stage].popleft()
+                self._waits[stage].append(time.monotonic() - queued)
+            started = time.monotonic()
+            error = None
+            if job.error is None:
+                try:
+                    job.graph.run_task(stage)
+                except Exception as e:
+                    error = e
+            elapsed = time.monotonic() - started
+            with self._cond:
+                self._busy[model] += elapsed
+                self._service[stage].append(elapsed)
+                job.outstanding -= 1
+                job.error = job.error or error
+                if job.error is None:
+                    for name, deps in list(job.remaining.items()):
+                        deps.discard(stage)
+                        if not deps:
+                            del job.remaining[name]
+                            self._enqueue(job, name)
+                if job.outstanding == 0:
+                    self.in_flight -= 1
+                    self.latencies.append(time.monotonic() - job.admitted)
+                    self.failed += job.error is not None
+                    self._done.append(job)
+                    self._cond.notify_all()
+
+    def run(self, items, start, finish):
+        """Push every item down the line and return the stats.
+
+        `start(item)` builds the item's TaskGraph and `finish(item, graph,
+        error)` is called on this thread once the item is done or has failed
+        (error is None on success; graph is None if `start` raised).
+        """
+        self._started = time.monotonic()
+        workers = [threading.Thread(target=self._work, args=(model,), name=f"{model}-{number}", daemon=True)
+                   for model, size in self.pools.items() for number in range(size)]
+        for worker in workers:
+            worker.start()
+        pending = deque(items)
+        try:
+            while pending or self.in_flight:
+                while pending and self.in_flight < self.max_in_flight:
+                    item = pending.popleft()
+                    try:
+                        self._admit(item, start(item))
+                    except Exception as e:
+                        self.failed += 1
+                        finish(item, None, e)
+                with self._cond:
+                    while not self._done and self.in_flight and (self.in_flight >= self.max_in_flight or not pending):
+                        self._cond.wait()
+                    done, self._done = list(self._done), deque()
+                for job in done:
+                    finish(job.item, job.graph, job.error)
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            for worker in workers:
+                worker.join()
+        return self.stats()
+
+    def stats(self):
+        wall = time.monotonic() - self._started
+        with self._cond:
+            for stage in self.models:
+                self._account(stage)
+            return {
+                "wall_seconds": round(wall, 3),
+                "concepts": len(self.latencies),
+                "failed": self.failed,
+                "latency_seconds": percentiles(self.latencies),
+                "stages": {stage: {
+                    "model": model,
+                    "tasks": len(self._service[stage]),
+                    "mean_queue_depth": round(self._depth[stage]["area"] / wall, 2) if wall else 0.0,
+                    "max_queue_depth": self._depth[stage]["max"],
+                    "wait_seconds": percentiles(self._waits[stage]),
+                    "service_seconds": percentiles(self._service[stage]),
+                } for stage, model in self.models.items()},
+                "pools": {model: {
+                    "workers": size,
+                    "busy_seconds": round(self._busy[model], 3),
+                    "utilization": round(self._busy[model] / (size * wall), 3) if size and wall else 0.0,
+                } for model, size in self.pools.items()},
+            }
+
+
+def report(stats):
+    latency = stats["latency_seconds"]
+    lines = [f"{stats['concepts']} concepts in {stats['wall_seconds']}s, end-to-end latency "
+             f"p50 {latency['p50']}s / p90 {latency['p90']}s / p99 {latency['p99']}s"]
+    for stage, stage_stats in stats["stages"].items():
+        lines.append(f"  {stage:9} {stage_stats['model']:15} queue mean {stage_stats['mean_queue_depth']:>5} "
+                     f"max {stage_stats['max_queue_depth']:>3}, wait p90 {stage_stats['wait_seconds']['p90']}s, "
+                     f"service p50 {stage_stats['service_seconds']['p50']}s")
+    for model, pool in stats["pools"].items():
+        lines.append(f"  pool {model:15} {pool['workers']:>2} workers, {pool['utilization']:.0%} busy")
+    if stats["pools"]:
+        bottleneck = max(stats["pools"], key=lambda model: stats["pools"][model]["utilization"])
+        lines.append(f"  bottleneck: {bottleneck}")
+    return lines
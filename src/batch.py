@@ -0,0 +1,69 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def read_concepts(lines):
+    """Read concepts one per line. JSONL lines may be objects with a "concept" key or plain strings."""
+    concepts = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line[0] in '{"':
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                item = line
+            if isinstance(item, dict):
+                item = item.get("concept", "")
+            line = str(item).strip()
+        if line:
+            concepts.append(line)
+    return concepts
+
+
+def run_batch(concepts, workers=4, results_path="batch_results.jsonl", run=None):
+    """Run one crew per concept in a bounded worker pool and write one record per concept."""
+    if run is None:
+        from main import run_concept as run
+
+    started = time.perf_counter()
+    succeeded = 0
+
+    def run_one(index, concept):
+        begin = time.perf_counter()
+        record = {"index": index, "concept": concept}
+        try:
+            result = run(concept)
+            # variant runs return their comparison bundle, which stays JSON
+            record["result"] = result if isinstance(result, dict) else str(result)
+            record["status"] = "ok"
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["seconds"] = round(time.perf_counter() - begin, 3)
+        return record
+
+    with open(results_path, "a") as results_file, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(run_one, index, concept) for index, concept in enumerate(concepts)]
+        for future in as_completed(futures):
+            record = future.result()
+            if record["status"] == "ok":
+                succeeded += 1
+            results_file.write(json.dumps(record) + "\n")
+            results_file.flush()
+            print(f"[{record['index']}] {record['status']} in {record['seconds']}s: {record['concept']}")
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "concepts": len(concepts),
+        "succeeded": succeeded,
+        "failed": len(concepts) - succeeded,
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "concepts_per_minute": round(len(concepts) / elapsed * 60, 2) if elapsed else 0.0,
+    }
+    print(f"Batch finished: {summary['succeeded']}/{summary['concepts']} ok in {summary['seconds']}s "
+          f"({summary['concepts_per_minute']} concepts/min with {workers} workers)")
+    return summary
@@ -0,0 +1,63 @@
+import hashlib
+import json
+import os
+import time
+
+from utils import atomic_write, run_dir
+
+
+def _digest(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class RunStore():
+    """Persists a run's settings and every finished task under runs/<run_id>/.
+
+    `run.json` holds what the run was started with; `tasks/<name>.json` holds a
+    task's output together with the description and context that produced it.
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.directory = run_dir(run_id)
+        self.tasks_directory = os.path.join(self.directory, "tasks")
+
+    def save_meta(self, **meta):
+        meta = dict(meta, run_id=self.run_id, created=time.time())
+        atomic_write(os.path.join(self.directory, "run.json"), json.dumps(meta, indent=2))
+
+    def load_meta(self):
+        path = os.path.join(self.directory, "run.json")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No run {self.run_id!r} in {os.path.dirname(self.directory)}")
+        with open(path) as meta_file:
+            return json.load(meta_file)
+
+    def _task_path(self, name):
+        return os.path.join(self.tasks_directory, f"{name}.json")
+
+    def save_task(self, name, task, context, output):
+        atomic_write(self._task_path(name), json.dumps({
+            "name": name,
+            "agent": getattr(task.agent, "role", None),
+            "description_sha256": _digest(task.description),
+            "context": context,
+            "output": output,
+            "finished": time.time(),
+        }, indent=2))
+
+    def load_task(self, name, task):
+        """The saved output for `name`, or None if missing or produced by a different task description."""
+        path = self._task_path(name)
+        if not os.path.exists(path):
+            return None
+        with open(path) as task_file:
+            saved = json.load(task_file)
+        if saved["description_sha256"] != _digest(task.description):
+            return None
+        return saved
+
+    def completed(self):
+        if not os.path.isdir(self.tasks_directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.tasks_directory) if name.endswith(".json"))
@@ -0,0 +1,171 @@
+import hashlib
+import math
+import os
+import re
+from functools import lru_cache
+from threading import Lock
+
+from metrics import current_run
+from ratelimit import limited_invoke
+from utils import callback_logger
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional, fall back to the usual ~4 chars per token
+    _encoding = None
+
+# Max context tokens handed to each task, on top of its own description
+TASK_BUDGETS = {
+    "research": 2500,
+    "outline": 6000,
+    "draft": 5000,
+    "critique": 7000,
+    "script": 6000,
+}
+DEFAULT_BUDGET = int(os.environ.get("SAGA_CONTEXT_BUDGET", "8000"))
+
+HEADING = re.compile(r"^\s*(#{1,6}\s+.+|\*\*[^*]+\*\*:?\s*|[A-Z][A-Z0-9 ,'&-]{3,}:?|\d+\.\s+\*\*.+)$")
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+def _paragraphs(text):
+    return [paragraph for paragraph in re.split(r"\n\s*\n", text) if paragraph.strip()]
+
+
+def _normalize(paragraph):
+    return re.sub(r"\W+", " ", paragraph).strip().lower()
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut `text` to roughly `max_tokens`, preferring a sentence boundary."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(0, max_tokens * 4)]
+    boundary = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("\n"))
+    if boundary > len(cut) // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + " [...]"
+
+
+def deduplicate(parts, seen_text=""):
+    """Drop paragraphs already present in `seen_text` (the task description) or in an earlier part."""
+    seen = {_normalize(paragraph) for paragraph in _paragraphs(seen_text)}
+    result = []
+    for name, text in parts:
+        kept = []
+        for paragraph in _paragraphs(text or ""):
+            key = _normalize(paragraph)
+            if key and key in seen:
+                continue
+            seen.add(key)
+            kept.append(paragraph)
+        result.append((name, "\n\n".join(kept)))
+    return result
+
+
+def extract_sections(text, max_tokens):
+    """Keep every section heading and trim each section body to an equal share of the budget."""
+    sections = []
+    for line in text.splitlines():
+        if HEADING.match(line) or not sections:
+            sections.append([line])
+        else:
+            sections[-1].append(line)
+    share = max(16, max_tokens // max(1, len(sections)))
+    trimmed = []
+    for lines in sections:
+        heading, body = lines[0], "\n".join(lines[1:]).strip()
+        trimmed.append(f"{heading}\n{truncate_tokens(body, share)}" if body else heading)
+    return "\n\n".join(trimmed)
+
+
+@lru_cache(maxsize=256)
+def _cached_summary(digest, text, max_tokens):
+    from llms import get_model
+    prompt = (
+        f"Condense the following document to at most {max_tokens} tokens. Keep names, dates, figures, "
+        f"section headings and anything a scriptwriter would need; drop repetition.\n\n{text}"
+    )
+    return limited_invoke("claude-3-haiku", get_model("claude-3-haiku"), prompt).content
+
+
+def summarize(text, max_tokens):
+    return _cached_summary(hashlib.sha256(text.encode("utf-8")).hexdigest(), text, max_tokens)
+
+
+class ContextAssembler():
+    """Builds a task's context from its upstream outputs within a per-task token budget.
+
+    Reductions are applied in order of cost until the context fits: dropping
+    paragraphs repeated from the task description or another upstream output,
+    trimming the largest outputs down to their section headings and leading
+    sentences, and finally a cached Haiku summary of whatever is still too big.
+    """
+
+    def __init__(self, budgets=None, default_budget=DEFAULT_BUDGET, use_summaries=True):
+        self.budgets = dict(TASK_BUDGETS if budgets is None else budgets)
+        self.default_budget = default_budget
+        self.use_summaries = use_summaries
+        self.saved = {}
+        self._lock = Lock()
+
+    def budget_for(self, name):
+        return self.budgets.get(name, self.default_budget)
+
+    def __call__(self, name, task, parts):
+        budget = self.budget_for(name)
+        joined = "\n".join(text for _, text in parts if text)
+        before = count_tokens(joined)
+        if not budget or before <= budget:
+            return joined
+
+        reductions = ["dedupe"]
+        parts = deduplicate(parts, task.description)
+        if self._total(parts) > budget:
+            reductions.append("sections")
+            parts = self._shrink(parts, budget, extract_sections)
+        if self._total(parts) > budget and self.use_summaries:
+            reductions.append("summary")
+            parts = self._shrink(parts, budget, summarize)
+
+        context = "\n".join(text for _, text in parts if text)
+        after = count_tokens(context)
+        with self._lock:
+            self.saved[name] = self.saved.get(name, 0) + before - after
+        callback_logger.log({
+            "run_id": current_run.get(),
+            "agent": getattr(task.agent, "role", None),
+            "step": "context",
+            "task": name,
+            "budget": budget,
+            "tokens_before": before,
+            "tokens_after": after,
+            "tokens_saved": before - after,
+            "reductions": reductions,
+        })
+        print(f"Context for {name}: {before} -> {after} tokens ({', '.join(reductions)})")
+        return context
+
+    @staticmethod
+    def _total(parts):
+        return sum(count_tokens(text) for _, text in parts)
+
+    def _shrink(self, parts, budget, reduce):
+        """Keep parts that fit an even share of the budget and `reduce` the rest down to their share."""
+        sizes = {name: count_tokens(text) for name, text in parts}
+        result = {name: text or "" for name, text in parts}
+        remaining = budget
+        for index, name in enumerate(sorted(sizes, key=sizes.get)):
+            share = remaining // (len(sizes) - index)
+            if sizes[name] > share:
+                result[name] = reduce(result[name], share)
+            remaining -= min(count_tokens(result[name]), share)
+        return [(name, result[name]) for name, _ in parts]
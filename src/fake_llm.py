@@ -0,0 +1,134 @@
+import hashlib
+import os
+import random
+import time
+from typing import Any, Dict
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from prompt_cache import SimulatedPromptCache, cached_prefix, text_of
+
+WORDS = (
+    "story scene camera narrator light shadow city river voice memory night signal engine "
+    "archive machine ocean fire silence window question answer future history mountain "
+    "doorway stranger letter clock garden mirror storm harbor orbit compass lantern"
+).split()
+
+
+# Shared by every fake model, like the provider's cache is shared by every client
+simulated_cache = SimulatedPromptCache()
+
+
+def fake_settings(spec=None):
+    """Parse SAGA_FAKE_LLM, e.g. "latency=0.2,prefill=0.05,words=400,scenes=4", into FakeChatModel fields."""
+    spec = os.environ.get("SAGA_FAKE_LLM", "") if spec is None else spec
+    settings = {}
+    for part in spec.split(","):
+        key, _, value = part.partition("=")
+        if key.strip() in ("latency", "jitter", "prefill"):
+            settings[key.strip()] = float(value)
+        elif key.strip() in ("words", "scenes"):
+            settings[key.strip()] = int(value)
+        elif key.strip() == "cache":
+            settings["prompt_cache"] = value.strip() not in ("0", "off", "false")
+    return settings
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for a chat model, for offline runs and benchmarks.
+
+    The reply is a pseudo-random text of `words` words seeded by the model
+    name and the prompt, so the same prompt always gets the same answer. It
+    is shaped as a crewai final answer, split into `scenes` "Scene N:"
+    sections if set, takes `latency` (+/- `jitter`) seconds and reports
+    token usage the way the real providers do.
+
+    Prompts carrying cache_control blocks go through `simulated_cache`:
+    prefix tokens come back as cache reads or writes like Anthropic reports
+    them, and only uncached prompt tokens pay `prefill` seconds per 1000
+    before the first token.
+    """
+
+    model_name: str = "fake"
+    latency: float = 0.0
+    jitter: float = 0.0
+    words: int = 200
+    scenes: int = 0
+    prefill: float = 0.0
+    prompt_cache: bool = True
+    streaming: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "saga-fake"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "words": self.words, "scenes": self.scenes}
+
+    @staticmethod
+    def _prompt(messages):
+        if isinstance(messages, str):
+            return messages
+        return "\n".join(text_of(getattr(message, "content", message)) for message in messages)
+
+    def reply(self, prompt):
+        seed = hashlib.sha256(f"{self.model_name}\x00{prompt}".encode("utf-8")).digest()
+        rng = random.Random(seed)
+        words = [rng.choice(WORDS) for _ in range(self.words)]
+        if self.scenes:
+            size = -(-len(words) // self.scenes)
+            body = "\n\n".join(f"Scene {index // size + 1}: {' '.join(words[index:index + size])}"
+                                for index in range(0, len(words), size))
+        else:
+            body = " ".join(words)
+        return f"Thought: I now can give a great answer\nFinal Answer: {body}", rng
+
+    def _usage(self, messages, prompt, text):
+        prefix = cached_prefix(messages) if self.prompt_cache else None
+        cache_read, cache_write = simulated_cache.lookup(self.model_name, prefix, len(prefix or "") // 4)
+        return {
+            "input_tokens": len(prompt) // 4 - cache_read - cache_write,
+            "output_tokens": len(text) // 4,
+            "cache_read_input_tokens": cache_read,
+            "cache_creation_input_tokens": cache_write,
+        }
+
+    def _wait(self, rng, usage):
+        uncached = usage["input_tokens"] + usage["cache_creation_input_tokens"]
+        delay = self.prefill * uncached / 1000 + self.latency
+        if self.jitter:
+            delay += rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = self._prompt(messages)
+        text, rng = self.reply(prompt)
+        usage = self._usage(messages, prompt, text)
+        if self.streaming:
+            time.sleep(self.prefill * (usage["input_tokens"] + usage["cache_creation_input_tokens"]) / 1000)
+            chunks = text.split(" ")
+            pause = max(0.0, self.latency) / max(1, len(chunks))
+            for index, chunk in enumerate(chunks):
+                token = chunk if index == 0 else f" {chunk}"
+                if pause:
+                    time.sleep(pause)
+                if run_manager:
+                    run_manager.on_llm_new_token(token)
+        else:
+            self._wait(rng, usage)
+        message = AIMessage(content=text, response_metadata={"usage": usage, "model": self.model_name})
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"usage": usage, "model_name": self.model_name})
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        text, rng = self.reply(prompt)
+        for index, chunk in enumerate(text.split(" ")):
+            token = chunk if index == 0 else f" {chunk}"
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import time
+from threading import Lock
+from typing import Optional
+
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.globals import set_llm_cache
+from langchain_core.load import dumps, loads
+
+from utils import atomic_write
+
+CACHE_MODES = ("off", "read-through", "record", "replay")
+LOW_WATER = 0.9  # eviction frees space down to this fraction of max_bytes
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+
+class DiskLLMCache(BaseCache):
+    """Content-addressed response store for chat models.
+
+    Entries are keyed by a sha256 of the model's llm_string (model name and
+    parameters) plus the serialized message list, and live as one JSON file per
+    key under `directory`. Entries older than `max_age` seconds are dropped on
+    read, and once the store grows past `max_bytes` the least recently used
+    ones are evicted down to LOW_WATER of it, so not every write pays for a
+    scan of the store.
+    """
+
+    def __init__(self, directory=".llm_cache", mode="read-through", max_bytes=512 * 1024 * 1024, max_age=None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown LLM cache mode {mode!r}, expected one of {CACHE_MODES}")
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._sizes = {path: os.path.getsize(path) for path in self._entries()}
+        self._total_bytes = sum(self._sizes.values())
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        if self.mode == "record":
+            return None
+        key = self.key(prompt, llm_string)
+        path = self._path(key)
+        try:
+            with open(path) as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            entry = None
+        if entry is not None and self.max_age is not None and time.time() - entry["created"] > self.max_age:
+            self._remove(path)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise CacheMiss(f"No recorded response for {key} ({llm_string[:80]})")
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:  # evicted by another worker since we read it
+            pass
+        return [loads(generation) for generation in entry["generations"]]
+
+    def contains(self, prompt: str, llm_string: str) -> bool:
+        """Whether lookup() would serve this prompt, without counting a hit or miss."""
+        if self.mode == "record":
+            return False
+        path = self._path(self.key(prompt, llm_string))
+        if self.max_age is None:
+            return os.path.exists(path)
+        try:
+            with open(path) as entry_file:
+                return time.time() - json.load(entry_file)["created"] <= self.max_age
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if self.mode == "replay":
+            return
+        key = self.key(prompt, llm_string)
+        path = self._path(key)
+        data = json.dumps({
+            "created": time.time(),
+            "llm_string": llm_string,
+            "generations": [dumps(generation) for generation in return_val],
+        })
+        atomic_write(path, data)  # a temp file of its own, so workers recording the same key don't collide
+        with self._lock:
+            self._total_bytes += len(data) - self._sizes.get(path, 0)
+            self._sizes[path] = len(data)
+        self._evict()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._total_bytes -= self._sizes.pop(path, 0)
+
+    def _evict(self):
+        if self.max_bytes is None or self._total_bytes <= self.max_bytes:
+            return
+        with self._lock:
+            paths = list(self._sizes)
+        for path in sorted(paths, key=_last_used):
+            if self._total_bytes <= self.max_bytes * LOW_WATER:
+                break
+            self._remove(path)
+
+    def clear(self, **kwargs) -> None:
+        for path in list(self._sizes):
+            self._remove(path)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._sizes),
+            "bytes": self._total_bytes,
+        }
+
+
+def _last_used(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+_configured = False
+
+
+def ensure_llm_cache():
+    """Configure the cache from the environment unless something already configured it."""
+    if not _configured:
+        configure_llm_cache()
+
+
+def configure_llm_cache(mode=None, directory=None):
+    """Install the disk cache for every chat model, driven by LLM_CACHE_* env vars by default."""
+    global _configured
+    _configured = True
+    mode = mode or os.environ.get("LLM_CACHE_MODE", "off")
+    if mode == "off":
+        set_llm_cache(None)
+        return None
+    max_mb = os.environ.get("LLM_CACHE_MAX_MB")
+    max_age_days = os.environ.get("LLM_CACHE_MAX_AGE_DAYS")
+    cache = DiskLLMCache(
+        directory=directory or os.environ.get("LLM_CACHE_DIR", ".llm_cache"),
+        mode=mode,
+        max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else 512 * 1024 * 1024,
+        max_age=float(max_age_days) * 86400 if max_age_days else None,
+    )
+    set_llm_cache(cache)
+    return cache
@@ -1,32 +1,119 @@
 import os
+from threading import Lock
 from dotenv import load_dotenv
-from langchain_anthropic import ChatAnthropic
-from langchain_openai import ChatOpenAI
 
 load_dotenv()
 anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
+# Seconds one provider request may take; waiting for rate limits is bounded separately, see router.py
+REQUEST_TIMEOUT = float(os.environ.get("SAGA_REQUEST_TIMEOUT", "180"))
 
-ClaudeHaiku = ChatAnthropic(
-  model_name="claude-3-haiku-20240307",
-  api_key=anthropic_api_key,
-)
-
-ClaudeOpus = ChatAnthropic(
-  model_name="claude-3-opus-20240229",
-  api_key=anthropic_api_key,
-  temperature=0.6
-)
-
-ClaudeSonnet = ChatAnthropic(
-  model_name="claude-3-sonnet-20240229",
-  api_key=anthropic_api_key,
-  temperature=0.6
-)
-
-GPT4Turbo = ChatOpenAI(
-  temperature=0.5, model="gpt-4"
-)
-
-GPT3Turbo = ChatOpenAI(
-  model="gpt-3.5-turbo"
-)
+# Clients are only built (and their SDKs imported) the first time get_model() asks for them.
+MODEL_SPECS = {
+  "claude-3-haiku": ("anthropic", dict(
+    model_name="claude-3-haiku-20240307",
+  )),
+  "claude-3-opus": ("anthropic", dict(
+    model_name="claude-3-opus-20240229",
+    temperature=0.6,
+  )),
+  "claude-3-sonnet": ("anthropic", dict(
+    model_name="claude-3-sonnet-20240229",
+    temperature=0.6,
+  )),
+  "gpt-4": ("openai", dict(
+    temperature=0.5, model="gpt-4",
+  )),
+  "gpt-3.5-turbo": ("openai", dict(
+    model="gpt-3.5-turbo",
+  )),
+}
+
+# The names the rest of the code has always imported, e.g. `from llms import ClaudeOpus`
+ALIASES = {
+  "ClaudeHaiku": "claude-3-haiku",
+  "ClaudeOpus": "claude-3-opus",
+  "ClaudeSonnet": "claude-3-sonnet",
+  "GPT4Turbo": "gpt-4",
+  "GPT3Turbo": "gpt-3.5-turbo",
+}
+
+_models = {}
+_lock = Lock()
+_streaming = {"enabled": os.environ.get("SAGA_STREAM") == "1", "console": True}
+
+
+def _build(name):
+  from llm_cache import ensure_llm_cache
+  from metrics import llm_metrics
+
+  # Response cache shared by every model, see LLM_CACHE_MODE in env.example
+  ensure_llm_cache()
+
+  provider, params = MODEL_SPECS[name]
+  if os.environ.get("SAGA_FAKE_LLM"):
+    # Offline, deterministic stand-in with the real model id, see fake_llm.py and benchmarks/pipeline.py
+    from fake_llm import FakeChatModel as model_class
+    from fake_llm import fake_settings
+    params = dict(fake_settings(), model_name=params.get("model_name") or params["model"])
+  elif provider == "anthropic":
+    from langchain_anthropic import ChatAnthropic as model_class
+    params = dict(params, api_key=anthropic_api_key, max_retries=0, timeout=REQUEST_TIMEOUT)
+  else:
+    from langchain_openai import ChatOpenAI as model_class
+    params = dict(params, max_retries=0, timeout=REQUEST_TIMEOUT)
+
+  # Every model reports timing, tokens and cost to llm_metrics, see metrics.py.
+  # Retries are left to ratelimit.limited_invoke so they share the process-wide limits.
+  model = model_class(**params, callbacks=[llm_metrics])
+  if _streaming["enabled"]:
+    _stream(model)
+  return model
+
+
+def get_model(name):
+  """The shared client for `name`, built on first use."""
+  model = _models.get(name)
+  if model is None:
+    with _lock:
+      model = _models.get(name)
+      if model is None:
+        model = _models[name] = _build(name)
+  return model
+
+
+def prepare_messages(name, messages):
+  """Provider-specific touches to a prompt before it is sent to `name`.
+
+  Anthropic only reuses a prompt prefix that is marked with cache_control,
+  so its requests get breakpoints after the static instructions
+  (see prompt_cache.py). OpenAI caches long prefixes without being asked.
+  """
+  if MODEL_SPECS[name][0] == "anthropic":
+    from prompt_cache import with_cache_breakpoints
+    return with_cache_breakpoints(messages)
+  return messages
+
+
+def __getattr__(attribute):
+  if attribute in ALIASES:
+    return get_model(ALIASES[attribute])
+  raise AttributeError(f"module {__name__!r} has no attribute {attribute!r}")
+
+
+def _stream(model):
+  from streaming import stream_handler
+  stream_handler.console = _streaming["console"]
+  model.streaming = True
+  if stream_handler not in model.callbacks:
+    model.callbacks = [*model.callbacks, stream_handler]
+
+
+def enable_streaming(models=None, console=True):
+  """Stream tokens from `models` (default: all of them) to the console and runs/<run_id>/stream/."""
+  with _lock:
+    _streaming["console"] = console
+    if models is None:
+      _streaming["enabled"] = True
+    built = dict(_models)
+  for name in models or built:
+    _stream(get_model(name) if models else built[name])
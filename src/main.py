@@ -1,14 +1,16 @@
 import os
+import sys
+import argparse
 from textwrap import dedent
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from utils import print_agent_output
+from utils import new_run_id, print_agent_output
 
-from crewai import Crew, Process, Task, Agent
-from llms import GPT4Turbo, ClaudeHaiku, ClaudeOpus
-from datetime import datetime
-from random import randint
-from langchain.tools import tool
+# crewai, langchain and the provider SDKs take seconds to import, so they are
+# imported inside the functions that build and run crews, not here.
+from sinks import SINK_KINDS, make_sink
+from checkpoint import RunStore
+from prompt_cache import CONCEPT_MARKER
+from functools import partial
 
 load_dotenv()
 
@@ -18,7 +20,9 @@ TONE = "Mysterious, engaging, suspenseful"
 CTA = "What if all you've been told is a lie? Follow to find the truth."
 SCRIPT_DURATION_IN_SECONDS = 240
 SCRIPT_DURATION_IN_WORDS = 600
-REQUIREMENTS = dedent(f"""\
+SCRIPT_CHECKS = dict(target_words=SCRIPT_DURATION_IN_WORDS, target_seconds=SCRIPT_DURATION_IN_SECONDS)
+def requirements(tone=TONE, writers=WRITERS_TO_EMULATE):
+    return dedent(f"""\
     **Requirements**:
         - The script should be specifically structured for a YouTube video, consisting of a voiceover narration that accompanies a series of visual scenes.
 
@@ -46,11 +50,13 @@ REQUIREMENTS = dedent(f"""\
         what the viewer should be seeing at each point in the script.
 
         Key elements to consider:
-            - Tone: {TONE}
-            - Writers to Emulate: {WRITERS_TO_EMULATE}
+            - Tone: {tone}
+            - Writers to Emulate: {writers}
             - Call-to-Action: {CTA}
             - Script Duration: {SCRIPT_DURATION_IN_SECONDS} seconds
 """)
+
+REQUIREMENTS = requirements()
 SCRIPT_CREATION_STEPS = dedent(f"""\
     The order of the script creation process is as follows:
     0: BRIEF: big_boss
@@ -59,7 +65,6 @@ SCRIPT_CREATION_STEPS = dedent(f"""\
     3: DRAFT: writer
     4: CRITIQUE: critic_editor. PASS THE FULL RESEARCH, FULL BRIEF, AND DRAFT TO THIS TASK!
     5: SCRIPT: writer
-    6: SAVE: archiver. PASS THE FINAL SCRIPT TO THIS AGENT!
 
     Tasks should be done ONCE and NO MORE, in the order specified above.
 """)
@@ -78,10 +83,23 @@ YOUTUBE_SCRIPT_REQUIREMENTS = dedent(f"""\
 
 
 class ScriptTasks():
+    """The pipeline's tasks. The brief and research always follow the default TONE and WRITERS_TO_EMULATE;
+    outline, draft and script follow `tone` and `writers`, so variants can share the first two."""
+
+    def __init__(self, tone=TONE, writers=WRITERS_TO_EMULATE):
+        self.tone = tone
+        self.writers = writers
+        self.requirements = requirements(tone, writers)
+        self.direction = "" if (tone, writers) == (TONE, WRITERS_TO_EMULATE) else (
+            f"This version of the script has its own direction, which takes precedence over the brief: "
+            f"the tone is {tone} and the writers to emulate are {writers}.\n"
+        )
+
     def imagine(self, agent, concept):
+        from crewai import Task
         return Task(
             description=dedent(f"""\
-                We are creating a video about {concept}.
+                We are creating a video about the concept given at the end of this task.
 
                 This are the requirements: {REQUIREMENTS}
                 
@@ -95,6 +113,8 @@ class ScriptTasks():
                 
                 - !!!: Establish an exact order of the tasks and workers to perform the script creation process. THIS IS CRITICAL
                     {SCRIPT_CREATION_STEPS}
+
+                {CONCEPT_MARKER} {concept}
             """),
             expected_output=dedent(f"""\
                 A detailed project brief that includes:
@@ -113,6 +133,7 @@ class ScriptTasks():
         )
 
     def research(self, agent):
+        from crewai import Task
         return Task(
             description=dedent(f"""\
                 Conduct in-depth research on the themes for the script, diving into the relevant subject matter, and contextual details. Gather information from your enormous wealth of knowledge with real-world examples to ensure accuracy and authenticity. Organize the research findings into a structured document.
@@ -125,6 +146,7 @@ class ScriptTasks():
         )
     
     def outline(self, agent):
+        from crewai import Task
         return Task(
             description=dedent(f"""\
                 Create a detailed outline for the script based on the *brief*, the *research findings* and the given *script direction* for the project.
@@ -132,16 +154,18 @@ class ScriptTasks():
                 Break down the narrative into distinct scenes or sections, describing the key events, character developments, and emotional beats. Ensure the outline has a clear beginning, middle, and end, with a logical flow and progression of ideas.
 
                 The outline should be optimized for a video of {SCRIPT_DURATION_IN_SECONDS} seconds.
-            """),
+            """) + self.direction,
             expected_output=dedent(f"""\
                 A comprehensive script outline with a hierarchical structure.
                 The top level should list the major scenes or sections, with nested bullet points providing more granular details about the content and purpose of each part. The outline should read like a condensed version of the full script.
+                Start each major scene on its own line as "Scene N: <title>".
             """),
             agent=agent,
             async_execution=False,
         )
     
     def draft(self, agent):
+        from crewai import Task
         # Take inspiration from the following writers: {WRITERS_TO_EMULATE}
         return Task(
             description=dedent(f"""\
@@ -151,9 +175,9 @@ class ScriptTasks():
 
                 {YOUTUBE_SCRIPT_REQUIREMENTS}
 
-                {REQUIREMENTS}
+                {self.requirements}
 
-            """),
+            """) + self.direction,
             expected_output=dedent(f"""\
                 A completed first draft of the script in standard YouTube video format:
                     - Narrative voiceover
@@ -165,6 +189,7 @@ class ScriptTasks():
         )
 
     def critique(self, agent):
+        from crewai import Task
         return Task(
             description=dedent(f"""\
                 Provide a thorough and constructive critique of the *final draft* for the 
@@ -257,6 +282,7 @@ class ScriptTasks():
         )
    
     def script(self, agent):
+        from crewai import Task
         return Task(
             description=dedent(f"""\
                 Create the final, polished script, using the *finalDraft* as a foundation and the *scriptCritique* as a guide for potential improvements.
@@ -274,7 +300,7 @@ class ScriptTasks():
                 Remember, the *scriptCritique* is just one perspective. Trust your instincts and let your unique voice shine through in the final script.
 
                 KEEP IN MIND THE ORIGINAL REQUIREMENTS
-            """),
+            """) + self.direction,
             expected_output=dedent(f"""\
                 The completed script, refined based on your creative judgment and adhering to all technical requirements.
             """),
@@ -282,16 +308,20 @@ class ScriptTasks():
             async_execution=False,
         )
 
-    def saveOutput(self, agent):
-        return Task(
-            description="""Take the final script and save it to a markdown file.
-            Your final answer MUST be a response must be showing that the file was saved .""",
-            expected_output='A saved file name',
-            agent=agent,
-        )
-
 class ScriptAgents():
+    def __init__(self, run_id=None, writers=WRITERS_TO_EMULATE):
+        from profiling import profiler_for
+        self.run_id = run_id
+        self.writers = writers
+        self.profiler = profiler_for(run_id)
+
+    def step_callback(self, agent_name):
+        callback = lambda x: print_agent_output(x, agent_name, self.run_id)
+        return self.profiler.wrap_callback(agent_name, callback) if self.profiler else callback
+
     def big_boss(self):
+        from crewai import Agent
+        from router import Policy, RoutedChatModel
         return Agent(
             role="The director and concept developer",
             goal="provide precise project briefs that guide the production of high-quality YouTube content",
@@ -316,17 +346,20 @@ class ScriptAgents():
                     resonates with viewers.
                 </your_work>
             """),
-            llm=ClaudeHaiku,
+            llm=RoutedChatModel(policy=Policy("fast", prefer="claude-3-haiku")),
             ##llm=GPT4Turbo,
             #memory=True
             max_iterations=1,
             #tools=human_tools,
             # step_callback=print_agent_output
-            step_callback=lambda x: print_agent_output(x,"Big Boss Agent"),
+            step_callback=self.step_callback("Big Boss Agent"),
             allow_delegation=False
         )
         
     def researcher(self):
+        from crewai import Agent
+        from router import Policy, RoutedChatModel
+        from search_tools import research_tools
         # Modeled after a fact-checker
         return Agent(
             role="Master Researcher",
@@ -337,13 +370,16 @@ class ScriptAgents():
             
             Your mission is to provide a solid factual foundation for ideas, ensuring that narratives are authentic and grounded in reality.
             """),
-            llm=ClaudeHaiku,
+            llm=RoutedChatModel(policy=Policy("fast", prefer="claude-3-haiku")),
             max_iterations=1,
+            tools=research_tools(),
             allow_delegation=False,
-            step_callback=lambda x: print_agent_output(x,"Researcher Agent")
+            step_callback=self.step_callback("Researcher Agent")
         )
         
     def senior_writer(self):
+        from crewai import Agent
+        from router import Policy, RoutedChatModel
         # Modeled after Ernest Hemingway
         return Agent(
             role="The Master Writer of narrative, focusing on thematic depth and succinct storytelling",
@@ -355,16 +391,19 @@ class ScriptAgents():
 
                 With a penchant for robust, impactful narratives, you write stories that resonate deeply with YouTube audiences, delivering your message in a way that is both direct and emotionally engaging.
 
-                You emulate the styles of literary greats like {WRITERS_TO_EMULATE}, infusing your scripts with their unique voices and narrative techniques. Your scripts are a blend of mystery, suspense, and emotional depth, leaving viewers both entertained and intellectually stimulated.
+                You emulate the styles of literary greats like {self.writers}, infusing your scripts with their unique voices and narrative techniques. Your scripts are a blend of mystery, suspense, and emotional depth, leaving viewers both entertained and intellectually stimulated.
             """),
             #llm=GPT4Turbo,
-            llm=ClaudeOpus,
-            memory=True,
+            llm=RoutedChatModel(policy=Policy("quality", prefer="claude-3-opus")),
+            # crewai's embedding memory is replaced by the run-scoped memory.py backend
+            memory=False,
             allow_delegation=False,
-            step_callback=lambda x: print_agent_output(x,"Senior Writer Agent")
+            step_callback=self.step_callback("Senior Writer Agent")
         )
 
     def critic_editor(self):
+        from crewai import Agent
+        from router import Policy, RoutedChatModel
         return Agent(
             role="Ruthless analyst, unforgiving critic, and meticulous editor, ensuring scripts meet the highest standards of precision, depth, and artistic quality",
             goal="To relentlessly critique and edit scripts, pushing writers to elevate their work to exceptional levels",
@@ -377,54 +416,24 @@ class ScriptAgents():
 
                 Your mission is to uphold your legendary status by combining your critical insights and editorial prowess to elevate every project to its maximum potential, even if it means bruising a few egos along the way. You are the gatekeeper of quality, and you will not rest until every script meets your exacting standards.
             """),
-            llm=GPT4Turbo,
+            llm=RoutedChatModel(policy=Policy("quality", prefer="gpt-4")),
             max_iterations=1,
-            step_callback=lambda x: print_agent_output(x, "Critic Editor Agent"),
+            step_callback=self.step_callback("Critic Editor Agent"),
         )
 
-    def archiver(self):
-        return Agent(
-            role='saves the script to a markdown file',
-            goal='Take in the final script and write it to a Markdown file',
-            backstory="""You are a efficient and simple agent that gets a final script and saves it to a markdown file. in a quick and efficient manner""",
-            llm=GPT4Turbo,
-            verbose=True,
-            step_callback=lambda x: print_agent_output(x,"Archiver Agent"),
-            tools=[save_content],
-        )   
-
-@tool("save_content")
-def save_content(task_output):
-    """Useful to save content to a markdown file"""
-    print('in the save markdown tool')
-    # Get today's date in the format YYYY-MM-DD
-    today_date = datetime.now().strftime('%Y-%m-%d')
-    # Set the filename with today's date
-    filename = f"{today_date}_{randint(0,100)}.md"
-    # Write the task output to the markdown file
-    with open(filename, 'w') as file:
-        file.write(task_output)
-        # file.write(task_output.result)
-
-    print(f"Blog post saved as {filename}")
-
-    return f"Blog post saved as {filename}, please tell the user we are finished"
-
-def main():
-    tasks = ScriptTasks()
-    agents = ScriptAgents()
-
-    print("# Welcome to the Saga Creative Offices")
-    print("---------------------------------")
+def build_tasks(concept, sink=None, run_id=None, tone=TONE, writers=WRITERS_TO_EMULATE):
+    """Build the agents and the named tasks for one concept, wired through `.context`.
 
-    concept = input("What is the concept you would like to develop today?")
+    The final script goes straight from the `script` task to `sink`, no archiver agent involved.
+    """
+    tasks = ScriptTasks(tone, writers)
+    agents = ScriptAgents(run_id, writers)
 
     # Agents
     big_boss = agents.big_boss()
     researcher = agents.researcher()
     senior_writer = agents.senior_writer()
     critic_editor = agents.critic_editor()
-    archiver = agents.archiver()
 
     # Tasks
     brief = tasks.imagine(big_boss, concept)
@@ -433,45 +442,444 @@ def main():
     draft = tasks.draft(senior_writer)
     scriptCritique = tasks.critique(critic_editor)
     script = tasks.script(senior_writer)
-    saveOutput = tasks.saveOutput(archiver)
 
     researchFindings.context = [brief]
     outline.context = [brief, researchFindings]
     draft.context = [brief, outline]
     scriptCritique.context = [draft, brief, researchFindings]
     script.context = [draft, scriptCritique,]
-    saveOutput.context = [script]
 
+    if sink is not None:
+        script.callback = lambda output: print(f"Script saved to {sink.write(concept, output.raw_output)}")
+
+    return [
+        big_boss,
+        researcher,
+        senior_writer,
+        critic_editor,
+    ], {
+        "imagine": brief,
+        "research": researchFindings,
+        "outline": outline,
+        "draft": draft,
+        "critique": scriptCritique,
+        "script": script,
+    }
+
+def build_crew(concept, sink=None, run_id=None):
+    from crewai import Crew, Process
+    from llms import GPT4Turbo
+
+    agents, tasks = build_tasks(concept, sink, run_id)
 
     # Crew
-    crew = Crew(
-        agents=[
-            big_boss,
-            researcher,
-            senior_writer,
-            critic_editor,
-            archiver,
-        ],
-        tasks=[
-            brief,
-            researchFindings,
-            outline,
-            draft,
-            scriptCritique,
-            script,
-            saveOutput,
-        ],
+    return Crew(
+        agents=agents,
+        tasks=list(tasks.values()),
         #manager_llm=ClaudeOpus,
         manager_llm=GPT4Turbo,
         process=Process.sequential,
         memory=False,
         verbose=2,
-        step_callback=lambda x: print_agent_output(x,"MasterCrew Agent")
+        step_callback=lambda x: print_agent_output(x, "MasterCrew Agent", run_id)
     )
 
-    result = crew.kickoff()
+def build_runners(tasks, concept, scene_draft=False, revision_rounds=0, script_check=True, research_reuse="off",
+                  memory=None, profiler=None):
+    """The TaskGraph runners that replace a plain execute_task for some of `tasks`."""
+    from memory import Remembering
+    from profiling import Profiled
+    from research_index import ResearchReuse
+    from revision import ScriptGate, ScriptReviser
+    from scenes import SceneDrafter
+    from scheduler import execute_task
+
+    runners = {}
+    if research_reuse != "off":
+        runners["research"] = ResearchReuse(tasks["imagine"], concept, research_reuse)
+    if scene_draft:
+        runners["draft"] = SceneDrafter(tasks["outline"], SCRIPT_DURATION_IN_WORDS)
+    if revision_rounds:
+        runners["script"] = ScriptReviser(tasks["draft"], tasks["critique"], rounds=revision_rounds)
+    if script_check:
+        # Mechanical requirements are checked locally, a model is only asked to fix what fails
+        runners["draft"] = ScriptGate(runners.get("draft", execute_task), **SCRIPT_CHECKS)
+        runners["script"] = ScriptGate(runners.get("script", execute_task), cta=CTA, **SCRIPT_CHECKS)
+    if memory is not None:
+        runners = {name: Remembering(memory, tasks, runners.get(name, execute_task)) for name in tasks}
+    if profiler is not None:
+        runners = {name: Profiled(profiler, name, runners.get(name, execute_task)) for name in tasks}
+    return runners
+
+def index_research(run_id, research_reuse="off"):
+    from research_index import research_index
+
+    # Later runs can start from this one's research, see research_index.py
+    index = research_index()
+    index.add_run(run_id)
+    index.save()
+    if research_reuse != "off":
+        print(f"Research reuse: {index.stats['hits']}/{index.stats['lookups']} hits "
+              f"({index.hit_rate():.0%}), {index.stats['tokens_saved']} tokens saved so far")
+
+def print_report(run_id, report):
+    total = report["total"]
+    print(f"Run {run_id}: {total['calls']} LLM calls, {total['input_tokens']} in "
+          f"(+{total['cache_read_tokens']} from prompt cache) / {total['output_tokens']} out tokens, "
+          f"~${total['cost_usd']:.4f} (${total['cache_saved_usd']:.4f} saved by caching)")
+
+def finish_report(run_id, task_seconds):
+    """Write the run's metrics with its rate limit, hedging, memory and (if enabled) profile stats, and print them."""
+    from memory import close_memory
+    from metrics import write_report
+    from profiling import close_profiler, report as profile_report
+    from ratelimit import limiter_stats
+    from router import close_hedging
+
+    extra = {"rate_limits": limiter_stats(), "hedging": close_hedging(run_id), "task_seconds": task_seconds,
+             "memory": close_memory(run_id)}
+    profile = close_profiler(run_id)
+    if profile is not None:
+        extra["profile"] = profile
+    report = write_report(run_id, extra=extra)
+    print_report(run_id, report)
+    if profile is not None:
+        print(f"Profile of {run_id} in runs/{run_id}/profile/")
+        print("\n".join(profile_report(profile)))
+    return report
+
+def concept_graph(concept, sink=None, run_id=None, context_budget=True, scene_draft=False, revision_rounds=0,
+                  script_check=True, research_reuse="off", memory="local"):
+    """The TaskGraph for one concept, checkpointed to runs/<run_id>/."""
+    from context import ContextAssembler
+    from memory import memory_for
+    from profiling import profiler_for
+    from scheduler import TaskGraph, join_context
+
+    _, tasks = build_tasks(concept, sink, run_id)
+    runners = build_runners(tasks, concept, scene_draft, revision_rounds, script_check, research_reuse,
+                            memory_for(run_id) if memory == "local" else None, profiler_for(run_id))
+    return TaskGraph(tasks, run_id, ContextAssembler() if context_budget else join_context, RunStore(run_id),
+                     runners)
+
+def run_concept(concept, sequential=False, sink=None, run_id=None, context_budget=True, resume=False,
+                scene_draft=False, revision_rounds=0, script_check=True, research_reuse="off", memory="local"):
+    if sink is None:
+        sink = make_sink("markdown")
+    from metrics import stage
+
+    run_id = run_id or new_run_id()
+    store = RunStore(run_id)
+    task_seconds = {}
+    if not resume:
+        store.save_meta(concept=concept, sequential=sequential, context_budget=context_budget,
+                        scene_draft=scene_draft, revision_rounds=revision_rounds, script_check=script_check,
+                        research_reuse=research_reuse, memory=memory)
+
+    try:
+        if sequential and not resume:
+            crew = build_crew(concept, sink, run_id)
+            with stage(run_id, "crew"):
+                return crew.kickoff()
+
+        graph = concept_graph(concept, sink, run_id, context_budget, scene_draft, revision_rounds, script_check,
+                              research_reuse, memory)
+        task_seconds = graph.durations
+        outputs = graph.run()
+        index_research(run_id, research_reuse)
+        path, seconds = graph.critical_path()
+        print(f"Critical path ({seconds:.1f}s): {' -> '.join(path)}")
+        return outputs[graph.order[-1]]
+    finally:
+        finish_report(run_id, task_seconds)
+
+def run_pipelined(concepts, pools=None, results_path="batch_results.jsonl", sink=None, context_budget=True,
+                  scene_draft=False, revision_rounds=0, script_check=True, research_reuse="off", memory="local"):
+    """Batch mode as an assembly line: every stage of every concept queues for its model's worker pool.
+
+    Writes the same records as batch.run_batch, and the per-stage queue,
+    utilisation and latency stats of assembly.AssemblyLine next to them.
+    """
+    import json
+    import time
+    from assembly import AssemblyLine, report
+    from utils import atomic_write
+
+    if sink is None:
+        sink = make_sink("markdown")
+    started = {}
+
+    def start(item):
+        index, concept = item
+        run_id = new_run_id()
+        RunStore(run_id).save_meta(concept=concept, context_budget=context_budget, scene_draft=scene_draft,
+                                   revision_rounds=revision_rounds, script_check=script_check,
+                                   research_reuse=research_reuse, memory=memory, pipelined=True)
+        started[index] = time.perf_counter()
+        return concept_graph(concept, sink, run_id, context_budget, scene_draft, revision_rounds, script_check,
+                             research_reuse, memory)
+
+    def finish(item, graph, error):
+        index, concept = item
+        record = {"index": index, "concept": concept, "run_id": graph.run_id if graph else None}
+        if error is None:
+            record.update(status="ok", result=str(graph.outputs[graph.order[-1]]))
+            index_research(graph.run_id, research_reuse)
+        else:
+            record.update(status="error", error=f"{type(error).__name__}: {error}")
+        if graph is not None:
+            finish_report(graph.run_id, graph.durations)
+        record["seconds"] = round(time.perf_counter() - started.get(index, time.perf_counter()), 3)
+        results_file.write(json.dumps(record) + "\n")
+        results_file.flush()
+        print(f"[{index}] {record['status']} in {record['seconds']}s: {concept}")
+
+    line = AssemblyLine(pools)
+    with open(results_path, "a") as results_file:
+        stats = line.run(list(enumerate(concepts)), start, finish)
+    stats_path = f"{os.path.splitext(results_path)[0]}_stages.json"
+    atomic_write(stats_path, json.dumps(stats, indent=2))
+    print(f"Assembly line stats in {stats_path}")
+    print("\n".join(report(stats)))
+    return stats
+
+def run_variant(concept, variant, upstream, sink=None, run_id=None, context_budget=True, resume=False,
+                scene_draft=False, revision_rounds=0, script_check=True, memory="local"):
+    """Run the variant-specific stages of one variant off the shared `upstream` outputs."""
+    import time
+    from context import ContextAssembler
+    from memory import memory_for
+    from profiling import profiler_for
+    from scheduler import TaskGraph, join_context
+    from variants import variant_run_id
+
+    variant_id = variant_run_id(run_id, variant)
+    store = RunStore(variant_id)
+    if not resume:
+        store.save_meta(concept=concept, variant_of=run_id, variant=variant._asdict())
+    _, tasks = build_tasks(concept, run_id=variant_id, tone=variant.tone, writers=variant.writers)
+    if sink is not None:
+        tasks["script"].callback = lambda output: print(
+            f"Variant {variant.name} saved to {sink.write(f'{concept} {variant.name}', output.raw_output)}")
+    variant_memory = None
+    if memory == "local":
+        # the shared stages are seeded, not run, so they are remembered here
+        variant_memory = memory_for(variant_id)
+        for name, output in upstream.items():
+            variant_memory.add(output, source=name)
+    runners = build_runners(tasks, concept, scene_draft, revision_rounds, script_check, memory=variant_memory,
+                            profiler=profiler_for(variant_id))
+    graph = TaskGraph(tasks, variant_id, ContextAssembler() if context_budget else join_context, store, runners,
+                      seeded=upstream)
+    started = time.perf_counter()
+    result = {}
+    try:
+        result["script"] = graph.run()["script"]
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        result["report"] = finish_report(variant_id, graph.durations)
+    return result
+
+def run_variants(concept, variants, sink=None, run_id=None, context_budget=True, resume=False,
+                 scene_draft=False, revision_rounds=0, script_check=True, research_reuse="off", memory="local"):
+    """Run the brief and research once, then outline/draft/critique/script for every variant at once.
+
+    Each variant runs as its own run (runs/<run_id>-<variant>/) seeded with
+    the shared outputs, so it only pays for its own stages. Returns the
+    comparison bundle, also written to runs/<run_id>/variants.json.
+    """
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+    from context import ContextAssembler
+    from profiling import profiler_for
+    from scheduler import TaskGraph, join_context
+    from variants import SHARED_STAGES, comparison, report, write_bundle
+
+    if sink is None:
+        sink = make_sink("markdown")
+    run_id = run_id or new_run_id()
+    store = RunStore(run_id)
+    if not resume:
+        store.save_meta(concept=concept, variants=[variant._asdict() for variant in variants],
+                        context_budget=context_budget, scene_draft=scene_draft, revision_rounds=revision_rounds,
+                        script_check=script_check, research_reuse=research_reuse, memory=memory)
+
+    graph = None
+    try:
+        _, tasks = build_tasks(concept, run_id=run_id)
+        shared = {name: tasks[name] for name in SHARED_STAGES}
+        graph = TaskGraph(shared, run_id, ContextAssembler() if context_budget else join_context, store,
+                          build_runners(tasks, concept, research_reuse=research_reuse, profiler=profiler_for(run_id)))
+        upstream = graph.run()
+        index_research(run_id, research_reuse)
+    finally:
+        shared_report = finish_report(run_id, graph.durations if graph else {})
+
+    with ThreadPoolExecutor(max_workers=len(variants), thread_name_prefix="variant") as pool:
+        futures = [
+            pool.submit(contextvars.copy_context().run, run_variant, concept, variant, upstream, sink, run_id,
+                        context_budget, resume, scene_draft, revision_rounds, script_check, memory)
+            for variant in variants
+        ]
+        results = [(variant, future.result()) for variant, future in zip(variants, futures)]
+
+    bundle = comparison(concept, run_id, shared_report, results, cta=CTA, **SCRIPT_CHECKS)
+    print(f"Variants compared in {write_bundle(bundle)}")
+    print("\n".join(report(bundle)))
+    return bundle
+
+def warm_up():
+    """Import the pipeline and build every model client the router may pick, without running anything."""
+    import context, memory, metrics, profiling, ratelimit  # noqa: F401,E401
+    import research_index, revision, scenes, scheduler  # noqa: F401,E401
+    import llms
+    from router import TASK_POLICIES, candidates
+    build_tasks("warm-up")
+    for name in dict.fromkeys(name for policy in TASK_POLICIES.values() for name in candidates(policy)):
+        llms.get_model(name)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Saga Creative Offices")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="read concepts from FILE (one per line or JSONL), '-' for stdin")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of crews to run at once in batch and serve mode")
+    parser.add_argument("--results", default="batch_results.jsonl",
+                        help="where batch mode writes one JSON record per concept")
+    parser.add_argument("--llm-cache", metavar="MODE",
+                        help="LLM response cache mode (off, read-through, record, replay), overrides LLM_CACHE_MODE")
+    parser.add_argument("--sink", choices=SINK_KINDS, default="markdown",
+                        help="where the final script is written")
+    parser.add_argument("--output",
+                        help="sink location: a directory for markdown, a file for jsonl/sqlite")
+    parser.add_argument("--no-context-budget", dest="context_budget", action="store_false",
+                        help="hand every task the full text of its upstream outputs")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream tokens to the console and runs/<run_id>/stream/ as they are generated")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="continue a failed run from its checkpoints in runs/RUN_ID")
+    parser.add_argument("--scene-draft", action="store_true",
+                        help="draft every outline scene in parallel and stitch them, instead of one long completion")
+    parser.add_argument("--patch-revision", dest="revision_rounds", nargs="?", type=int, const=1, default=0,
+                        metavar="ROUNDS",
+                        help="revise the draft with scene/paragraph edits instead of a full rewrite, "
+                             "optionally with more critique/revise ROUNDS")
+    parser.add_argument("--no-script-check", dest="script_check", action="store_false",
+                        help="skip the local length/dialogue/text-on-screen checks after draft and script")
+    parser.add_argument("--research-reuse", choices=("off", "context", "reuse"),
+                        default=os.environ.get("SAGA_RESEARCH_REUSE", "off"),
+                        help="start research from the most similar past run: as extra context, or reused "
+                             "with only the missing sections written")
+    parser.add_argument("--memory", choices=("local", "off"), default=os.environ.get("SAGA_MEMORY", "local"),
+                        help="give the writer's tasks recalled notes from earlier tasks of the run, from a bounded "
+                             "in-process memory (see memory.py), or no memory at all")
+    parser.add_argument("--profile", metavar="KINDS", nargs="?", const="all",
+                        help="write per-stage CPU profiles (cpu), allocation diffs (memory) and object-count "
+                             "deltas (objects) to runs/<run_id>/profile/, all of them by default; like SAGA_PROFILE")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="in batch mode, queue every stage for its model's worker pool so stages of different "
+                             "concepts overlap, instead of one crew per worker")
+    parser.add_argument("--pools", metavar="MODEL=N,...", default=os.environ.get("SAGA_POOLS"),
+                        help="worker pool sizes for --pipelined, e.g. ClaudeHaiku=8,ClaudeOpus=4,GPT4Turbo=4")
+    parser.add_argument("--serve", metavar="HOST:PORT", nargs="?",
+                        const=os.environ.get("SAGA_SERVE", "127.0.0.1:8000"),
+                        help="run a job service that queues concepts posted over HTTP, see service.py")
+    parser.add_argument("--queue-size", type=int, default=int(os.environ.get("SAGA_QUEUE_SIZE", "100")),
+                        help="concepts the job service holds before refusing new ones with 429")
+    parser.add_argument("--variant", dest="variants", metavar="TONE[;WRITERS]", action="append",
+                        help="fan outline/draft/critique/script out into one variant per --variant with its own "
+                             "tone and writers to emulate, sharing one brief and research; repeat for each variant")
+    parser.add_argument("--sequential", action="store_true",
+                        help="run tasks one after another through crew.kickoff() instead of the DAG scheduler")
+    args = parser.parse_args(argv)
+    if args.pools:
+        from assembly import parse_pools
+        try:
+            parse_pools(args.pools)
+        except ValueError as e:
+            parser.error(f"--pools: {e}")
+    if args.pipelined and args.variants:
+        parser.error("--pipelined runs one script per concept; it can't be combined with --variant")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile:
+        from profiling import enable_profiling
+        enable_profiling(args.profile)
+    if args.llm_cache:
+        from llm_cache import configure_llm_cache
+        configure_llm_cache(args.llm_cache)
+    if args.stream:
+        from llms import enable_streaming
+        # concurrent batch runs and service jobs would interleave on the console, so they only stream to disk
+        enable_streaming(console=not (args.batch or args.serve))
+
+    sink = make_sink(args.sink, args.output)
+
+    print("# Welcome to the Saga Creative Offices")
+    print("---------------------------------")
+
+    options = dict(sink=sink, context_budget=args.context_budget, scene_draft=args.scene_draft,
+                   revision_rounds=args.revision_rounds, script_check=args.script_check,
+                   research_reuse=args.research_reuse, memory=args.memory)
+    if args.variants:
+        from variants import parse_variants
+        run = partial(run_variants, variants=parse_variants(args.variants, TONE, WRITERS_TO_EMULATE), **options)
+    else:
+        run = partial(run_concept, sequential=args.sequential, **options)
+
+    if args.serve:
+        import asyncio
+        from service import JobService, serve
+        host, _, port = args.serve.rpartition(":")
+        service = JobService(run, workers=args.workers, queue_size=args.queue_size, warm_up=warm_up)
+        try:
+            asyncio.run(serve(service, host or "127.0.0.1", int(port)))
+        except KeyboardInterrupt:
+            print("Job service stopped")
+        return
+
+    if args.batch:
+        from batch import read_concepts, run_batch
+        if args.batch == "-":
+            concepts = read_concepts(sys.stdin)
+        else:
+            with open(args.batch) as concepts_file:
+                concepts = read_concepts(concepts_file)
+        if args.pipelined:
+            from assembly import parse_pools
+            run_pipelined(concepts, parse_pools(args.pools), args.results, **options)
+            return
+        run_batch(concepts, workers=args.workers, results_path=args.results, run=run)
+        return
+
+    if args.resume:
+        meta = RunStore(args.resume).load_meta()
+        print(f"Resuming run {args.resume}: {meta['concept']}")
+        options = dict(sink=sink, run_id=args.resume, context_budget=meta.get("context_budget", True),
+                       scene_draft=meta.get("scene_draft", False), revision_rounds=meta.get("revision_rounds", 0),
+                       script_check=meta.get("script_check", True),
+                       research_reuse=meta.get("research_reuse", "off"),
+                       # Runs saved before --memory existed use the same default as a new run
+                       memory=meta.get("memory", args.memory),
+                       resume=True)
+        if meta.get("variants"):
+            from variants import Variant
+            run_variants(meta["concept"], [Variant(**variant) for variant in meta["variants"]], **options)
+        else:
+            print(run_concept(meta["concept"], **options))
+        return
+
+    concept = input("What is the concept you would like to develop today?")
+
+    result = run(concept)
 
-    print(result)
+    if not args.variants:
+        # run_variants prints its comparison itself
+        print(result)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
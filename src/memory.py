@@ -0,0 +1,166 @@
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+from context import count_tokens, truncate_tokens
+from metrics import current_run, current_task
+from research_index import STOPWORDS
+from scheduler import execute_task
+from utils import callback_logger
+
+MEMORY_MODES = ("local", "off")
+MAX_ITEMS = int(os.environ.get("SAGA_MEMORY_ITEMS", "256"))
+MAX_BYTES = int(os.environ.get("SAGA_MEMORY_BYTES", str(512 * 1024)))
+DIMENSIONS = 2 ** 12
+RECALL_TASKS = ("outline", "draft", "script")  # the senior writer's tasks
+RECALL_TOKENS = 800
+MIN_SCORE = 0.15
+
+MEMORY_HEADING = "Relevant notes from earlier in this project:"
+
+
+def embed(text):
+    """Hashed bag-of-words vector {bucket: weight}, L2-normalised. Stable across processes, no model call."""
+    words = [word for word in re.findall(r"[a-z][a-z0-9'-]{2,}", (text or "").lower()) if word not in STOPWORDS]
+    vector = Counter()
+    for word, count in Counter(words).items():
+        bucket = zlib.crc32(word.encode("utf-8"))
+        vector[bucket % DIMENSIONS] += (1 + math.log(count)) * (1 if bucket & 0x80000000 else -1)
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {bucket: weight / norm for bucket, weight in vector.items() if weight}
+
+
+class BoundedMemory():
+    """In-process memory of a run's task outputs, kept within `max_items` and `max_bytes` by LRU eviction.
+
+    Outputs are stored paragraph by paragraph with hashed-vector embeddings,
+    so recall is a local dot product instead of an embedding API call.
+    Items returned by `search()` count as used and are evicted last.
+    """
+
+    def __init__(self, max_items=MAX_ITEMS, max_bytes=MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()  # text -> (source, vector)
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.seconds = 0.0
+
+    def add(self, text, source=None):
+        started = time.perf_counter()
+        for paragraph in re.split(r"\n\s*\n", text or ""):
+            paragraph = paragraph.strip()
+            if len(paragraph) < 40:
+                continue
+            vector = embed(paragraph)
+            with self._lock:
+                if paragraph in self.items:
+                    self.items.move_to_end(paragraph)
+                    continue
+                self.items[paragraph] = (source, vector)
+                self.bytes += len(paragraph.encode("utf-8"))
+                self._evict()
+        with self._lock:
+            self.seconds += time.perf_counter() - started
+
+    def _evict(self):
+        while self.items and (len(self.items) > self.max_items or self.bytes > self.max_bytes):
+            paragraph, _ = self.items.popitem(last=False)
+            self.bytes -= len(paragraph.encode("utf-8"))
+            self.evictions += 1
+
+    def search(self, query, limit=4, exclude=(), min_score=MIN_SCORE):
+        """[(score, paragraph), ...] most similar to `query`, best first, skipping sources in `exclude`."""
+        started = time.perf_counter()
+        query = embed(query)
+        with self._lock:
+            scores = []
+            for paragraph, (source, vector) in self.items.items():
+                if source in exclude:
+                    continue
+                score = sum(weight * vector.get(bucket, 0.0) for bucket, weight in query.items())
+                if score >= min_score:
+                    scores.append((round(score, 4), paragraph))
+            found = sorted(scores, reverse=True)[:limit]
+            for _, paragraph in found:
+                self.items.move_to_end(paragraph)
+            self.lookups += 1
+            self.hits += bool(found)
+            self.seconds += time.perf_counter() - started
+        return found
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self.items),
+                "bytes": self.bytes,
+                "max_items": self.max_items,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "seconds": round(self.seconds, 4),
+            }
+
+
+_memories = {}
+_memories_lock = threading.Lock()
+
+
+def memory_for(run_id):
+    """The memory scoped to `run_id`, created on first use."""
+    with _memories_lock:
+        if run_id not in _memories:
+            _memories[run_id] = BoundedMemory()
+        return _memories[run_id]
+
+
+def close_memory(run_id):
+    """Drop the run's memory and return its stats, or None if the run had none."""
+    with _memories_lock:
+        memory = _memories.pop(run_id, None)
+    return memory.stats() if memory else None
+
+
+class Remembering():
+    """Runner that remembers every task's output and hands the writer's tasks what they recall.
+
+    Notes recalled for RECALL_TASKS come only from tasks that aren't already
+    in the task's context, e.g. research for the draft and the script, and
+    are capped at RECALL_TOKENS. Tasks restored from checkpoints or seeded
+    by a variant run don't pass through runners; add them with
+    `memory.add()`.
+    """
+
+    def __init__(self, memory, tasks, run=execute_task):
+        self.memory = memory
+        self.run = run
+        self.names = {id(task): name for name, task in tasks.items()}
+
+    def __call__(self, task, context):
+        name = current_task.get()
+        started = time.perf_counter()
+        found, notes = [], ""
+        if name in RECALL_TASKS:
+            upstream = {self.names.get(id(dependency)) for dependency in task.context or []}
+            found = self.memory.search(f"{task.description}\n{context[-2000:]}", exclude=upstream | {name})
+            if found:
+                notes = truncate_tokens("\n\n".join(paragraph for _, paragraph in found), RECALL_TOKENS)
+                context = f"{context}\n\n{MEMORY_HEADING}\n{notes}"
+        recall_seconds = time.perf_counter() - started
+        result = self.run(task, context)
+        started = time.perf_counter()
+        self.memory.add(result, source=name)
+        callback_logger.log(dict(self.memory.stats(), run_id=current_run.get(),
+                                 agent=getattr(task.agent, "role", None), step="memory", task=name,
+                                 recalled=len(found), recalled_tokens=count_tokens(notes),
+                                 added_seconds=round(recall_seconds + time.perf_counter() - started, 4)))
+        return result
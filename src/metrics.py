@@ -0,0 +1,265 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utils import atomic_write, run_dir
+
+# USD per million (input, output) tokens
+PRICES = {
+    "claude-3-haiku-20240307": (0.25, 1.25),
+    "claude-3-sonnet-20240229": (3.0, 15.0),
+    "claude-3-opus-20240229": (15.0, 75.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+
+# Price of prompt-cache (read, write) tokens relative to ordinary input tokens, by model family
+CACHE_PRICE_FACTORS = {
+    "claude": (0.1, 1.25),
+    "gpt": (0.5, 1.0),
+}
+
+current_run = ContextVar("current_run", default=None)
+current_task = ContextVar("current_task", default=None)
+current_agent = ContextVar("current_agent", default=None)
+
+
+@contextmanager
+def stage(run_id, task_name, agent_name=None):
+    """Attribute every LLM call made inside the block to this run, task and agent."""
+    tokens = (current_run.set(run_id), current_task.set(task_name), current_agent.set(agent_name))
+    try:
+        yield
+    finally:
+        current_agent.reset(tokens[2])
+        current_task.reset(tokens[1])
+        current_run.reset(tokens[0])
+
+
+def _cache_factors(model):
+    for family, factors in CACHE_PRICE_FACTORS.items():
+        if model.startswith(family):
+            return factors
+    return 1.0, 1.0
+
+
+def estimate_cost(model, input_tokens, output_tokens, cache_read_tokens=0, cache_write_tokens=0):
+    """USD for a call; `input_tokens` are the prompt tokens that were neither read from nor written to the cache."""
+    input_price, output_price = PRICES.get(model, (0.0, 0.0))
+    read_factor, write_factor = _cache_factors(model)
+    prompt = input_tokens + cache_read_tokens * read_factor + cache_write_tokens * write_factor
+    return (prompt * input_price + output_tokens * output_price) / 1_000_000
+
+
+def cache_savings(model, cache_read_tokens, cache_write_tokens):
+    """USD saved by the prompt cache on a call, net of the surcharge for writing it."""
+    input_price, _ = PRICES.get(model, (0.0, 0.0))
+    read_factor, write_factor = _cache_factors(model)
+    return (cache_read_tokens * (1 - read_factor) - cache_write_tokens * (write_factor - 1)) * input_price / 1_000_000
+
+
+def _usage_counts(usage):
+    """{input, output, cache_read, cache_write} from a provider usage dict; input excludes cached tokens."""
+    details = usage.get("prompt_tokens_details") or usage.get("input_token_details") or {}
+    cache_read = (usage.get("cache_read_input_tokens") or details.get("cached_tokens")
+                  or details.get("cache_read") or 0)
+    cache_write = usage.get("cache_creation_input_tokens") or details.get("cache_creation") or 0
+    if "prompt_tokens" in usage:
+        # OpenAI counts cached tokens as part of prompt_tokens
+        input_tokens = usage["prompt_tokens"] - cache_read
+    elif "input_token_details" in usage:
+        # langchain's usage_metadata does too
+        input_tokens = usage.get("input_tokens", 0) - cache_read - cache_write
+    else:
+        # Anthropic reports uncached input separately
+        input_tokens = usage.get("input_tokens", 0)
+    return {
+        "input": input_tokens,
+        "output": usage.get("output_tokens", usage.get("completion_tokens", 0)),
+        "cache_read": cache_read,
+        "cache_write": cache_write,
+    }
+
+
+def _token_usage(response):
+    """Token counts, including prompt-cache reads and writes, out of an LLMResult from either provider."""
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            metadata = getattr(message, "response_metadata", None) or {}
+            usage = metadata.get("usage") or metadata.get("token_usage")
+            if usage:
+                return _usage_counts(usage)
+            usage = getattr(message, "usage_metadata", None)
+            if usage:
+                return _usage_counts(dict(usage, input_token_details=usage.get("input_token_details") or {}))
+    llm_output = response.llm_output or {}
+    return _usage_counts(llm_output.get("token_usage") or llm_output.get("usage") or {})
+
+
+class LLMMetrics(BaseCallbackHandler):
+    """Callback handler that times every chat model call and collects token usage per run."""
+
+    def __init__(self):
+        self._pending = {}
+        self._calls = {}
+        self._lock = Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, **kwargs):
+        params = invocation_params or {}
+        self._pending[run_id] = {
+            "run_id": current_run.get(),
+            "task": current_task.get() or "unattributed",
+            "agent": current_agent.get(),
+            "model": params.get("model") or params.get("model_name") or "unknown",
+            "started": time.perf_counter(),
+            "first_token": None,
+        }
+
+    def on_llm_start(self, serialized, prompts, *, run_id, invocation_params=None, **kwargs):
+        self.on_chat_model_start(serialized, [], run_id=run_id, invocation_params=invocation_params)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        call = self._pending.get(run_id)
+        if call is not None and call["first_token"] is None:
+            call["first_token"] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        call = self._pending.pop(run_id, None)
+        if call is None:
+            return
+        usage = _token_usage(response)
+        self._record(call, input_tokens=usage["input"], output_tokens=usage["output"],
+                     cache_read_tokens=usage["cache_read"], cache_write_tokens=usage["cache_write"])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        call = self._pending.pop(run_id, None)
+        if call is not None:
+            self._record(call, error=type(error).__name__)
+
+    def _record(self, call, input_tokens=0, output_tokens=0, cache_read_tokens=0, cache_write_tokens=0, error=None):
+        ended = time.perf_counter()
+        started = call.pop("started")
+        first_token = call.pop("first_token")
+        call.update(
+            wall_seconds=ended - started,
+            ttft_seconds=first_token - started if first_token is not None else None,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens,
+            prompt_cache="hit" if cache_read_tokens else "write" if cache_write_tokens else None,
+            cost_usd=estimate_cost(call["model"], input_tokens, output_tokens, cache_read_tokens, cache_write_tokens),
+            cache_saved_usd=cache_savings(call["model"], cache_read_tokens, cache_write_tokens),
+            error=error,
+        )
+        with self._lock:
+            self._calls.setdefault(call["run_id"], []).append(call)
+
+    def calls(self, run_id):
+        with self._lock:
+            return list(self._calls.get(run_id, []))
+
+    def report(self, run_id, clear=True):
+        """Aggregate a run's calls per task and per model."""
+        with self._lock:
+            calls = self._calls.pop(run_id, []) if clear else list(self._calls.get(run_id, []))
+
+        def summarize(group):
+            ttfts = [call["ttft_seconds"] for call in group if call["ttft_seconds"] is not None]
+            return {
+                "calls": len(group),
+                "errors": sum(1 for call in group if call["error"]),
+                "wall_seconds": round(sum(call["wall_seconds"] for call in group), 3),
+                "mean_ttft_seconds": round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+                "input_tokens": sum(call["input_tokens"] for call in group),
+                "output_tokens": sum(call["output_tokens"] for call in group),
+                "cache_hits": sum(1 for call in group if call["prompt_cache"] == "hit"),
+                "cache_misses": sum(1 for call in group if call["prompt_cache"] == "write"),
+                "cache_read_tokens": sum(call["cache_read_tokens"] for call in group),
+                "cache_write_tokens": sum(call["cache_write_tokens"] for call in group),
+                "cost_usd": round(sum(call["cost_usd"] for call in group), 6),
+                "cache_saved_usd": round(sum(call["cache_saved_usd"] for call in group), 6),
+            }
+
+        def grouped(key):
+            groups = {}
+            for call in calls:
+                groups.setdefault(call[key] or "unknown", []).append(call)
+            return {name: summarize(group) for name, group in groups.items()}
+
+        return {
+            "run_id": run_id,
+            "total": summarize(calls),
+            "tasks": grouped("task"),
+            "models": grouped("model"),
+            "agents": grouped("agent"),
+            "calls": calls,
+        }
+
+
+def prometheus_text(report):
+    """Render a run report in the Prometheus text exposition format."""
+    metrics = [
+        ("saga_llm_calls_total", "counter", "LLM calls", "calls"),
+        ("saga_llm_errors_total", "counter", "Failed LLM calls", "errors"),
+        ("saga_llm_wall_seconds_total", "counter", "Wall time spent in LLM calls", "wall_seconds"),
+        ("saga_llm_input_tokens_total", "counter", "Prompt tokens sent", "input_tokens"),
+        ("saga_llm_output_tokens_total", "counter", "Completion tokens received", "output_tokens"),
+        ("saga_llm_cache_read_tokens_total", "counter", "Prompt tokens read from the provider cache",
+         "cache_read_tokens"),
+        ("saga_llm_cache_write_tokens_total", "counter", "Prompt tokens written to the provider cache",
+         "cache_write_tokens"),
+        ("saga_llm_cost_usd_total", "counter", "Estimated spend in USD", "cost_usd"),
+        ("saga_llm_ttft_seconds", "gauge", "Mean time to first streamed token", "mean_ttft_seconds"),
+    ]
+    groups = {}
+    for call in report["calls"]:
+        groups.setdefault((call["task"], call["model"]), []).append(call)
+
+    lines = []
+    for name, kind, help_text, field in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (task, model), group in sorted(groups.items()):
+            if field == "calls":
+                value = len(group)
+            elif field == "errors":
+                value = sum(1 for call in group if call["error"])
+            elif field == "mean_ttft_seconds":
+                ttfts = [call["ttft_seconds"] for call in group if call["ttft_seconds"] is not None]
+                if not ttfts:
+                    continue
+                value = sum(ttfts) / len(ttfts)
+            else:
+                value = sum(call[field] for call in group)
+            lines.append(f'{name}{{run_id="{report["run_id"]}",task="{task}",model="{model}"}} {value}')
+
+    # Process-wide limiter state (ratelimit.limiter_stats), when the caller attached it
+    for field, value_type in (("in_flight", "gauge"), ("max_queue_depth", "gauge"), ("retries", "counter"),
+                              ("throttled", "counter"), ("wait_seconds", "counter")):
+        limits = report.get("rate_limits") or {}
+        if not limits:
+            break
+        lines.append(f"# TYPE saga_rate_limit_{field} {value_type}")
+        for model, stats in sorted(limits.items()):
+            lines.append(f'saga_rate_limit_{field}{{model="{model}"}} {stats[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_report(run_id, directory=None, extra=None):
+    """Write metrics.json and metrics.prom for a finished run and return the report."""
+    report = llm_metrics.report(run_id)
+    report.update(extra or {})
+    directory = directory or run_dir(run_id)
+    atomic_write(os.path.join(directory, "metrics.json"), json.dumps(report, indent=2))
+    atomic_write(os.path.join(directory, "metrics.prom"), prometheus_text(report))
+    return report
+
+
+llm_metrics = LLMMetrics()
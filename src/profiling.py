@@ -0,0 +1,274 @@
+import cProfile
+import gc
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from utils import atomic_write, run_dir
+
+PROFILE_KINDS = ("cpu", "memory", "objects")
+SAMPLE_INTERVAL = float(os.environ.get("SAGA_PROFILE_INTERVAL", "0.01"))
+TRACEMALLOC_FRAMES = 10
+TOP = 15
+
+
+def _parse_kinds(spec):
+    spec = (spec or "").strip().lower()
+    if spec in ("", "0", "off", "false", "no"):
+        return ()
+    if spec in ("1", "on", "true", "yes", "all"):
+        return PROFILE_KINDS
+    kinds = tuple(kind.strip() for kind in spec.split(",") if kind.strip())
+    unknown = set(kinds) - set(PROFILE_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown profile kinds {sorted(unknown)}, expected some of {PROFILE_KINDS}")
+    return kinds
+
+
+_kinds = _parse_kinds(os.environ.get("SAGA_PROFILE"))
+_profilers = {}
+_profilers_lock = threading.Lock()
+_tracing = {"runs": 0, "ours": False}  # profiled runs that need tracemalloc, and whether we started it
+_tracing_lock = threading.Lock()
+
+
+def enable_profiling(kinds="all"):
+    """Profile every run started from now on, like SAGA_PROFILE=<kinds>."""
+    global _kinds
+    _kinds = _parse_kinds(kinds)
+
+
+def profiler_for(run_id):
+    """The run's RunProfiler, or None when profiling is off, so callers add no hooks at all."""
+    if not _kinds or run_id is None:
+        return None
+    with _profilers_lock:
+        if run_id not in _profilers:
+            _profilers[run_id] = RunProfiler(run_id, _kinds)
+        return _profilers[run_id]
+
+
+def close_profiler(run_id):
+    """Write the run's profile artifacts and return its summary, or None if it wasn't profiled."""
+    with _profilers_lock:
+        profiler = _profilers.pop(run_id, None)
+    return profiler.close() if profiler else None
+
+
+def _start_tracing():
+    with _tracing_lock:
+        if _tracing["runs"] == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracing["ours"] = True
+        _tracing["runs"] += 1
+
+
+def _stop_tracing():
+    """Stop tracemalloc once the last run that needed it is done, unless someone else had started it."""
+    with _tracing_lock:
+        _tracing["runs"] -= 1
+        if _tracing["runs"] == 0 and _tracing["ours"]:
+            tracemalloc.stop()
+            _tracing["ours"] = False
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _snapshot():
+    """A tracemalloc snapshot without the allocations of the profilers themselves."""
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, module.__file__)
+        for module in (tracemalloc, cProfile, pstats, sys.modules[__name__])
+    ])
+
+
+def _object_counts():
+    return Counter(type(obj).__name__ for obj in gc.get_objects())
+
+
+class RunProfiler():
+    """CPU, allocation and object-count profiles of one run, per stage, under runs/<run_id>/profile/.
+
+    Every stage gets a cProfile .prof (pstats format) when its thread has no
+    other profiler active, a tracemalloc diff of what it left allocated, and
+    the growth in live objects by type. A sampling thread records the stacks
+    of all threads inside a stage as `stacks.folded` for flamegraph tools.
+    Stages that run at the same time share the process heap, so their
+    allocation and object diffs overlap.
+    """
+
+    def __init__(self, run_id, kinds=PROFILE_KINDS):
+        self.run_id = run_id
+        self.kinds = set(kinds)
+        self.directory = os.path.join(run_dir(run_id), "profile")
+        self.stages = {}
+        self.callbacks = {}
+        self.profiles = []
+        self.stacks = Counter()
+        self._active = {}  # thread id -> stage name
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+        if "memory" in self.kinds:
+            _start_tracing()
+        if "cpu" in self.kinds:
+            self._sampler = threading.Thread(target=self._sample, name=f"profile-{run_id}", daemon=True)
+            self._sampler.start()
+
+    def _sample(self):
+        while not self._stopped.wait(SAMPLE_INTERVAL):
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stage in active.items():
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    with self._lock:
+                        self.stacks[";".join([stage] + stack[::-1])] += 1
+
+    @contextmanager
+    def stage(self, name):
+        thread_id = threading.get_ident()
+        with self._lock:
+            outer = self._active.get(thread_id)
+            self._active[thread_id] = name
+        # Baselines first, so the profiler's own work stays out of the CPU profile
+        snapshot = _snapshot() if "memory" in self.kinds else None
+        objects = _object_counts() if "objects" in self.kinds else None
+        profile = None
+        if "cpu" in self.kinds and outer is None:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler is active on this interpreter (3.12+)
+                profile = None
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            record = {"wall_seconds": round(time.perf_counter() - wall, 4),
+                      "cpu_seconds": round(time.thread_time() - cpu, 4)}
+            if profile is not None:
+                profile.disable()
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"{name}.prof")
+                profile.dump_stats(path)
+                record["cpu_profile"] = os.path.basename(path)
+                self.profiles.append(path)
+            if snapshot is not None:
+                diff = _snapshot().compare_to(snapshot, "lineno")
+                grown = [stat for stat in diff if stat.size_diff > 0]
+                record["allocated_kb"] = round(sum(stat.size_diff for stat in diff) / 1024, 1)
+                record["top_allocators"] = [
+                    {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     "kb": round(stat.size_diff / 1024, 1), "blocks": stat.count_diff}
+                    for stat in sorted(grown, key=lambda stat: stat.size_diff, reverse=True)[:TOP]
+                ]
+            if objects is not None:
+                delta = _object_counts()
+                delta.subtract(objects)
+                record["object_deltas"] = dict(sorted(((kind, count) for kind, count in delta.items() if count > 0),
+                                                      key=lambda item: item[1], reverse=True)[:TOP])
+            with self._lock:
+                if outer is None:
+                    del self._active[thread_id]
+                else:
+                    self._active[thread_id] = outer
+                self.stages[name] = record
+
+    def wrap_callback(self, agent_name, callback):
+        """`callback` counted and timed per agent; only cheap counters, it runs inside a profiled stage."""
+        def profiled(*args, **kwargs):
+            traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                with self._lock:
+                    stats = self.callbacks.setdefault(agent_name, {"calls": 0, "wall_seconds": 0.0,
+                                                                   "cpu_seconds": 0.0, "allocated_kb": 0.0})
+                    stats["calls"] += 1
+                    stats["wall_seconds"] += time.perf_counter() - wall
+                    stats["cpu_seconds"] += time.thread_time() - cpu
+                    if traced:
+                        stats["allocated_kb"] += (tracemalloc.get_traced_memory()[0] - traced) / 1024
+        return profiled
+
+    def hottest_frames(self):
+        if not self.profiles:
+            return []
+        stats = pstats.Stats(*self.profiles, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:TOP]
+        return [{"frame": f"{function} ({os.path.basename(filename)}:{line})", "calls": calls,
+                 "self_seconds": round(own, 4), "cumulative_seconds": round(cumulative, 4)}
+                for (filename, line, function), (_, calls, own, cumulative, _) in rows]
+
+    def close(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        os.makedirs(self.directory, exist_ok=True)
+        if self.stacks:
+            atomic_write(os.path.join(self.directory, "stacks.folded"),
+                         "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+        summary = {
+            "kinds": sorted(self.kinds),
+            "stages": self.stages,
+            "callbacks": {agent: {key: round(value, 4) for key, value in stats.items()}
+                          for agent, stats in self.callbacks.items()},
+            "hottest_frames": self.hottest_frames(),
+            "samples": sum(self.stacks.values()),
+        }
+        if "memory" in self.kinds:
+            current, peak = tracemalloc.get_traced_memory()
+            summary["traced_kb"] = {"current": round(current / 1024, 1), "peak": round(peak / 1024, 1)}
+        atomic_write(os.path.join(self.directory, "summary.json"), json.dumps(summary, indent=2))
+        atomic_write(os.path.join(self.directory, "summary.txt"), "\n".join(report(summary)) + "\n")
+        if "memory" in self.kinds:
+            _stop_tracing()
+        return summary
+
+
+def report(summary):
+    lines = [f"{'stage':12} {'wall':>8} {'cpu':>8} {'alloc KB':>10}  top allocator"]
+    for name, stage in summary["stages"].items():
+        top = stage.get("top_allocators") or [{}]
+        where = f"{top[0]['where']} ({top[0]['kb']} KB)" if top[0] else ""
+        lines.append(f"{name:12} {stage['wall_seconds']:>7.2f}s {stage['cpu_seconds']:>7.2f}s "
+                     f"{stage.get('allocated_kb', 0):>10}  {where}")
+    for agent, stats in summary["callbacks"].items():
+        lines.append(f"step callbacks of {agent}: {stats['calls']} calls, {stats['cpu_seconds']}s cpu, "
+                     f"{stats['allocated_kb']} KB")
+    if summary["hottest_frames"]:
+        lines.append("hottest frames (self time):")
+        lines += [f"  {frame['self_seconds']:>8.4f}s {frame['calls']:>8} calls  {frame['frame']}"
+                  for frame in summary["hottest_frames"]]
+    return lines
+
+
+class Profiled():
+    """Runner that runs `run` inside a profiled stage named after the task."""
+
+    def __init__(self, profiler, name, run):
+        self.profiler = profiler
+        self.name = name
+        self.run = run
+
+    def __call__(self, task, context):
+        with self.profiler.stage(self.name):
+            return self.run(task, context)
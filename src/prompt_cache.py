@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+
+# Where the per-run part of a prompt begins. Everything before the first
+# marker (agent role, backstory, tools, task description and the big
+# requirement blocks) is identical from one concept to the next.
+CONTEXT_MARKER = "This is the context you're working with:"  # crewai's task_with_context slice
+CONCEPT_MARKER = "The concept for this video:"  # last line of ScriptTasks.imagine
+VARIABLE_MARKERS = (CONTEXT_MARKER, CONCEPT_MARKER)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+MAX_BREAKPOINTS = 4  # Anthropic's limit per request
+
+
+def split_prompt(text):
+    """(stable prefix, variable suffix) of a prompt; the prefix is empty if no marker is found."""
+    cuts = [index for index in (text.find(marker) for marker in VARIABLE_MARKERS) if index > 0]
+    if not cuts:
+        return "", text
+    return text[:min(cuts)], text[min(cuts):]
+
+
+def text_of(content):
+    """Plain text of a message's content, whether a string or a list of content blocks."""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+
+
+def _with_content(message, content):
+    return message.__class__(content=content, additional_kwargs=getattr(message, "additional_kwargs", {}))
+
+
+def with_cache_breakpoints(messages):
+    """Copy of `messages` with Anthropic cache_control markers at the end of their stable prefix.
+
+    System messages are static and cached whole; in a human message the
+    breakpoint goes right before the concept or upstream context. Messages
+    without a stable prefix, and plain string prompts, are left alone.
+    """
+    if isinstance(messages, str):
+        return messages
+    marked = []
+    breakpoints = 0
+    for message in messages:
+        content = getattr(message, "content", None)
+        if breakpoints >= MAX_BREAKPOINTS or not isinstance(content, str):
+            marked.append(message)
+            continue
+        if getattr(message, "type", None) == "system":
+            prefix, suffix = content, ""
+        else:
+            prefix, suffix = split_prompt(content)
+        if not prefix:
+            marked.append(message)
+            continue
+        blocks = [{"type": "text", "text": prefix, "cache_control": CACHE_CONTROL}]
+        if suffix:
+            blocks.append({"type": "text", "text": suffix})
+        marked.append(_with_content(message, blocks))
+        breakpoints += 1
+    return marked
+
+
+def cached_prefix(messages):
+    """The prompt text up to and including the last cache_control block, or None."""
+    seen = []
+    prefix = None
+    for message in messages if not isinstance(messages, str) else ():
+        content = getattr(message, "content", "")
+        if isinstance(content, str):
+            seen.append(content)
+            continue
+        for block in content:
+            seen.append(text_of([block]))
+            if isinstance(block, dict) and block.get("cache_control"):
+                prefix = "".join(seen)
+    return prefix
+
+
+class SimulatedPromptCache():
+    """In-process stand-in for a provider prompt cache, used by fake_llm.FakeChatModel.
+
+    Like Anthropic's, it only caches prefixes of at least `min_tokens`, and an
+    entry lives `ttl` seconds from its last use.
+    """
+
+    def __init__(self, ttl=300, min_tokens=1024):
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self._expiry = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, model, prefix, prefix_tokens):
+        """Return (cache read tokens, cache write tokens) for a request with this prefix."""
+        if not prefix or prefix_tokens < self.min_tokens:
+            return 0, 0
+        key = hashlib.sha256(f"{model}\x00{prefix}".encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            hit = self._expiry.get(key, 0) > now
+            self._expiry[key] = now + self.ttl
+        return (prefix_tokens, 0) if hit else (0, prefix_tokens)
+
+    def clear(self):
+        with self._lock:
+            self._expiry.clear()
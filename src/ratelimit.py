@@ -0,0 +1,274 @@
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# (requests per minute, tokens per minute, max concurrent requests) per model
+DEFAULT_LIMITS = {
+    "claude-3-haiku": (50, 50000, 8),
+    "claude-3-sonnet": (50, 40000, 8),
+    "claude-3-opus": (50, 20000, 4),
+    "gpt-4": (500, 10000, 4),
+    "gpt-3.5-turbo": (3500, 80000, 16),
+}
+MAX_RETRIES = int(os.environ.get("SAGA_MAX_RETRIES", "3"))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+SLOT_POLL = 0.25  # seconds between cancellation checks while waiting for a free slot
+
+
+class CallCancelled(Exception):
+    """The caller gave up on a call before it was sent."""
+
+
+def _load_limits():
+    limits = dict(DEFAULT_LIMITS)
+    override = os.environ.get("SAGA_RATE_LIMITS")
+    if override == "off":
+        return {}
+    if override:
+        limits.update({name: tuple(value) for name, value in json.loads(override).items()})
+    return limits
+
+
+class TokenBucket():
+    """Refills `per_minute` units a minute. Reservations may run into debt, which callers wait off."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount):
+        """Take `amount` units now and return how many seconds to wait before using them."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= min(amount, self.capacity)
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount):
+        """Give back a reservation that will not be used."""
+        self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+
+class ModelLimiter():
+    """Process-wide request/token budget and concurrency cap for one model."""
+
+    def __init__(self, name, rpm, tpm, concurrency):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.calls = 0
+        self.retries = 0
+        self.throttled = 0
+        self.gave_up = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self, tokens, deadline=None, cancelled=None):
+        """Wait until a request of `tokens` may be sent.
+
+        If that can't happen before `deadline` (a time.monotonic() value), or
+        the `cancelled` event is set meanwhile, the reservation is given back
+        and TimeoutError or CallCancelled raised instead.
+        """
+        started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            delay = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        try:
+            if deadline is not None and started + delay > deadline:
+                raise TimeoutError(f"{self.name} is rate limited for another {delay:.0f}s, past the deadline")
+            if cancelled is None:
+                time.sleep(delay)
+            elif cancelled.wait(delay):
+                raise CallCancelled(f"{self.name} call cancelled while rate limited")
+            while not self._slots.acquire(timeout=self._slot_wait(deadline, cancelled)):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"No free {self.name} slot before the deadline")
+                if cancelled is not None and cancelled.is_set():
+                    raise CallCancelled(f"{self.name} call cancelled while waiting for a slot")
+            if cancelled is not None and cancelled.is_set():
+                self._slots.release()
+                raise CallCancelled(f"{self.name} call cancelled before it was sent")
+        except (TimeoutError, CallCancelled):
+            with self._lock:
+                self.waiting -= 1
+                self.gave_up += 1
+                self.requests.refund(1)
+                self.tokens.refund(tokens)
+            raise
+        with self._lock:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.calls += 1
+            self.wait_seconds += time.monotonic() - started
+
+    @staticmethod
+    def _slot_wait(deadline, cancelled):
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        if cancelled is not None:
+            timeout = SLOT_POLL if timeout is None else min(timeout, SLOT_POLL)
+        return timeout
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def record_retry(self, throttled):
+        with self._lock:
+            self.retries += 1
+            self.throttled += int(throttled)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting,
+                "concurrency": self.concurrency,
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttled": self.throttled,
+                "gave_up": self.gave_up,
+                "wait_seconds": round(self.wait_seconds, 3),
+            }
+
+
+_limits = _load_limits()
+_limiters = {}
+_registry_lock = threading.Lock()
+
+
+def limiter_for(name):
+    """Shared limiter for a model name, or None if the model is not rate limited."""
+    if name not in _limits:
+        return None
+    with _registry_lock:
+        if name not in _limiters:
+            _limiters[name] = ModelLimiter(name, *_limits[name])
+        return _limiters[name]
+
+
+def limiter_stats():
+    with _registry_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+
+def _status(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(error):
+    if isinstance(error, TimeoutError):
+        return True
+    if _status(error) in RETRY_STATUSES:
+        return True
+    return any(marker in type(error).__name__ for marker in ("RateLimit", "Overloaded", "Timeout", "APIConnection"))
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, from retry-after-ms / retry-after headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff_delay(error, attempt):
+    """Honour retry-after when given, otherwise full-jitter exponential backoff."""
+    hinted = retry_after(error)
+    if hinted is not None:
+        return min(BACKOFF_CAP, hinted) + random.uniform(0, BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def estimate_tokens(model, messages):
+    text = messages if isinstance(messages, str) else " ".join(str(getattr(m, "content", m)) for m in messages)
+    return len(text) // 4 + (getattr(model, "max_tokens", None) or 1024)
+
+
+def _served_from_cache(model, messages, stop=None):
+    """Whether `model` will answer `messages` from the LLM cache, so no request reaches the provider."""
+    from langchain_core.globals import get_llm_cache
+    from langchain_core.load import dumps
+    cache = get_llm_cache()
+    if getattr(cache, "mode", None) == "replay":
+        return True
+    if cache is None or not hasattr(cache, "contains") or getattr(model, "cache", None) is False:
+        return False
+    try:
+        # The same key BaseChatModel looks the call up under
+        prompt = dumps(model._convert_input(messages).to_messages())
+        return cache.contains(prompt, model._get_llm_string(stop=stop))
+    except Exception:
+        return False
+
+
+def limited_invoke(name, model, messages, max_retries=MAX_RETRIES, deadline=None, cancelled=None, on_send=None,
+                   **kwargs):
+    """`model.invoke(messages)` under the shared limits for `name`, retrying transient failures.
+
+    No attempt is sent after `deadline` (a time.monotonic() value) or once
+    the `cancelled` event is set: waiting for the limits past either raises
+    TimeoutError or CallCancelled and a retry past either raises the last
+    error, so a caller that has moved on never pays for the call.
+    `on_send()` is called right before each attempt goes to the provider.
+    """
+    limiter = None if _served_from_cache(model, messages, kwargs.get("stop")) else limiter_for(name)
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire(estimate_tokens(model, messages), deadline, cancelled)
+        elif deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"{name} was not called before the deadline")
+        elif cancelled is not None and cancelled.is_set():
+            raise CallCancelled(f"{name} call cancelled before it was sent")
+        if on_send is not None:
+            on_send()
+        try:
+            return model.invoke(messages, **kwargs)
+        except Exception as e:
+            error = e
+        finally:
+            if limiter is not None:
+                limiter.release()
+        if attempt >= max_retries or not is_retryable(error):
+            raise error
+        if limiter is not None:
+            limiter.record_retry(_status(error) == 429)
+        delay = backoff_delay(error, attempt)
+        if deadline is not None and time.monotonic() + delay > deadline:
+            raise error
+        if cancelled is not None and cancelled.is_set():
+            raise error
+        time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,202 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from context import TASK_BUDGETS, count_tokens, truncate_tokens
+from metrics import current_run, current_task
+from scenes import final_answer
+from scheduler import execute_task, set_output
+from utils import RUNS_DIR, atomic_write, callback_logger
+
+REUSE_MODES = ("off", "context", "reuse")
+INDEX_PATH = os.environ.get("SAGA_RESEARCH_INDEX", os.path.join(RUNS_DIR, "research_index.json"))
+THRESHOLD = float(os.environ.get("SAGA_RESEARCH_THRESHOLD", "0.4"))
+
+STOPWORDS = set("""
+    a about above after again against all also an and any are as at be because been before being below between both
+    but by can could did do does doing down during each few for from further had has have having he her here hers
+    him his how i if in into is it its itself just may me might more most must my no nor not now of off on once only
+    or other our ours out over own same she should so some such than that the their theirs them then there these
+    they this those through to too under until up very was we were what when where which while who whom why will
+    with would you your script video brief concept research section sections project
+    audience tone narrative goals objectives duration seconds creative direction requirements key message messages
+    theme themes story youtube viewer viewers engaging scene scenes visual visuals core target intended use case
+""".split())
+
+DELTA_INSTRUCTIONS = (
+    "Below is a research document written for an earlier video on a similar concept, followed by the brief for "
+    "the new video. Do NOT repeat or rewrite the existing research. Write ONLY the additional research sections "
+    "the new brief needs that the existing document does not cover, in the same structured style with sources. "
+    "If nothing is missing, reply with an empty answer."
+)
+
+
+def terms(text):
+    return [word for word in re.findall(r"[a-z][a-z0-9'-]{2,}", (text or "").lower()) if word not in STOPWORDS]
+
+
+class ResearchIndex():
+    """TF-IDF index of past runs' concept and brief, pointing at their research output.
+
+    Built from the run artifacts in runs/<run_id>/ (run.json and the
+    imagine/research checkpoints) and kept in `path`. `refresh()` only reads
+    runs it hasn't seen, so the index grows incrementally as runs finish.
+    """
+
+    def __init__(self, path=INDEX_PATH, runs_dir=RUNS_DIR):
+        self.path = path
+        self.runs_dir = runs_dir
+        self._lock = threading.Lock()
+        self.documents = {}  # run_id -> {"terms": {term: count}, "concept": str}
+        self.stats = {"lookups": 0, "hits": 0, "tokens_saved": 0}
+        if os.path.exists(path):
+            with open(path) as index_file:
+                saved = json.load(index_file)
+            self.documents = saved.get("documents", {})
+            self.stats.update(saved.get("stats", {}))
+        self._document_frequency = Counter(term for document in self.documents.values() for term in document["terms"])
+
+    def _load(self, run_id, *path):
+        path = os.path.join(self.runs_dir, run_id, *path)
+        try:
+            with open(path) as artifact:
+                return json.load(artifact)
+        except (OSError, ValueError):
+            return None
+
+    def add_run(self, run_id):
+        """Index one finished run; returns False if it has no research to offer."""
+        research = self._load(run_id, "tasks", "research.json")
+        if not research or not research.get("output"):
+            return False
+        meta = self._load(run_id, "run.json") or {}
+        brief = self._load(run_id, "tasks", "imagine.json") or {}
+        counts = Counter(terms(f"{meta.get('concept', '')} {brief.get('output', '')}"))
+        with self._lock:
+            previous = self.documents.get(run_id)
+            if previous:
+                self._document_frequency.subtract(previous["terms"].keys())
+            self.documents[run_id] = {"terms": dict(counts), "concept": meta.get("concept")}
+            self._document_frequency.update(counts.keys())
+        return True
+
+    def refresh(self):
+        """Index every run under runs_dir that isn't indexed yet and save if anything changed."""
+        if not os.path.isdir(self.runs_dir):
+            return 0
+        added = sum(self.add_run(run_id) for run_id in sorted(os.listdir(self.runs_dir))
+                    if run_id not in self.documents and os.path.isdir(os.path.join(self.runs_dir, run_id)))
+        if added:
+            self.save()
+        return added
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({"documents": self.documents, "stats": self.stats})
+        atomic_write(self.path, data)
+
+    def _vector(self, counts):
+        total = len(self.documents) + 1
+        vector = {term: (1 + math.log(count)) * (math.log(total / (1 + self._document_frequency[term])) + 1)
+                  for term, count in counts.items()}
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {term: weight / norm for term, weight in vector.items()}
+
+    def search(self, text, limit=3, exclude=()):
+        """[(similarity, run_id), ...] of the runs most similar to `text`, best first."""
+        with self._lock:
+            query = self._vector(Counter(terms(text)))
+            scores = []
+            for run_id, document in self.documents.items():
+                if run_id in exclude:
+                    continue
+                vector = self._vector(document["terms"])
+                score = sum(weight * vector.get(term, 0.0) for term, weight in query.items())
+                if score:
+                    scores.append((round(score, 4), run_id))
+        return sorted(scores, reverse=True)[:limit]
+
+    def research(self, run_id):
+        saved = self._load(run_id, "tasks", "research.json")
+        return saved.get("output") if saved else None
+
+    def record(self, hit, tokens_saved=0):
+        with self._lock:
+            self.stats["lookups"] += 1
+            self.stats["hits"] += int(hit)
+            self.stats["tokens_saved"] += tokens_saved
+
+    def hit_rate(self):
+        return self.stats["hits"] / self.stats["lookups"] if self.stats["lookups"] else 0.0
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def research_index():
+    """The process-wide index, refreshed from the runs directory on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ResearchIndex()
+            _index.refresh()
+        return _index
+
+
+class ResearchReuse():
+    """Runner for the research task that starts from the most similar past research.
+
+    Below `threshold` the task runs as usual. Above it, in "context" mode the
+    prior research is appended to the task context for the researcher to
+    build on; in "reuse" mode it is taken as is and the researcher's model
+    only writes the sections the new brief needs on top of it.
+    """
+
+    def __init__(self, brief_task, concept, mode="context", index=None, threshold=THRESHOLD):
+        if mode not in REUSE_MODES:
+            raise ValueError(f"Unknown research reuse mode {mode!r}, expected one of {REUSE_MODES}")
+        self.brief_task = brief_task
+        self.concept = concept
+        self.mode = mode
+        self.index = index
+        self.threshold = threshold
+
+    def __call__(self, task, context):
+        index = self.index or research_index()
+        brief = getattr(getattr(self.brief_task, "output", None), "raw_output", None) or ""
+        matches = index.search(f"{self.concept} {brief}", limit=1, exclude={current_run.get()})
+        similarity, run_id = matches[0] if matches else (0.0, None)
+        prior = index.research(run_id) if run_id and similarity >= self.threshold else None
+        if not prior:
+            index.record(hit=False)
+            self._log(task, hit=False, similarity=similarity)
+            return execute_task(task, context)
+
+        print(f"Research: reusing run {run_id} (similarity {similarity:.2f}) as {self.mode}")
+        if self.mode == "context":
+            index.record(hit=True)
+            self._log(task, hit=True, similarity=similarity, source_run=run_id)
+            prior = truncate_tokens(prior, TASK_BUDGETS["research"])
+            return execute_task(task, f"{context}\n\nResearch from an earlier video on a similar concept. Build on "
+                                      f"it, keep what applies and only research what is missing:\n{prior}")
+
+        prompt = f"{DELTA_INSTRUCTIONS}\n\n# Existing research\n{prior}\n\n# New brief\n{brief or self.concept}"
+        delta = final_answer(task.agent.llm.invoke(prompt).content)
+        result = f"{prior}\n\n{delta}" if delta else prior
+        tokens_saved = max(0, count_tokens(prior) - count_tokens(delta))
+        index.record(hit=True, tokens_saved=tokens_saved)
+        self._log(task, hit=True, similarity=similarity, source_run=run_id, tokens_saved=tokens_saved)
+        set_output(task, result)
+        if task.callback:
+            task.callback(task.output)
+        return result
+
+    def _log(self, task, **record):
+        index = self.index or research_index()
+        callback_logger.log(dict(record, run_id=current_run.get(), agent=getattr(task.agent, "role", None),
+                                 step="research_reuse", task=current_task.get(), mode=self.mode,
+                                 hit_rate=round(index.hit_rate(), 3)))
@@ -0,0 +1,256 @@
+import json
+import re
+
+from analyzer import analyze
+from context import count_tokens
+from metrics import current_run, current_task, stage
+from prompt_cache import CONTEXT_MARKER
+from scenes import MARKDOWN_HEADING, SCENE_HEADING, final_answer
+from scheduler import execute_task, set_output
+from utils import callback_logger
+
+EDIT_OPS = ("replace", "insert_before", "insert_after", "delete")
+NO_CHANGES = "NO CHANGES"
+
+EDIT_INSTRUCTIONS = (
+    "Revise the draft below according to the notes before it, but do NOT rewrite it. Every paragraph of the draft is "
+    "labelled [P<n>] and every scene [S<n>], which stands for all of its paragraphs. Reply with JSON only, no "
+    'prose, in the form {"edits": [{"op": "replace", "target": "P3", "text": "new paragraph"}, ...]}. '
+    'Allowed ops: "replace" (swap the target for `text`), "insert_before" and "insert_after" (add `text` '
+    'next to the target), and "delete" (no `text`). Do not include the labels in `text`. Only touch what the '
+    "notes ask for; untouched paragraphs are kept exactly as they are. Each paragraph may be replaced or "
+    "deleted at most once."
+)
+CRITIQUE_INSTRUCTIONS = (
+    "Critique the revised script below against the task. List only the concrete problems that still need to be "
+    f"fixed, scene by scene. If it needs no further changes, reply exactly {NO_CHANGES}."
+)
+
+
+class PatchError(ValueError):
+    """The writer's edits could not be parsed or applied to the draft."""
+
+
+def split_paragraphs(text):
+    return [paragraph.strip() for paragraph in re.split(r"\n\s*\n", (text or "").strip()) if paragraph.strip()]
+
+
+def scene_ranges(paragraphs):
+    """{"S1": (first, last) paragraph index, ...} for paragraphs that open with a scene heading."""
+    for pattern in (SCENE_HEADING, MARKDOWN_HEADING):
+        starts = [index for index, paragraph in enumerate(paragraphs) if pattern.match(paragraph)]
+        if len(starts) >= 2:
+            break
+    else:
+        return {}
+    ends = starts[1:] + [len(paragraphs)]
+    return {f"S{number}": (start, end - 1) for number, (start, end) in enumerate(zip(starts, ends), 1)}
+
+
+def numbered(paragraphs, scenes):
+    scene_at = {start: name for name, (start, _) in scenes.items()}
+    lines = []
+    for index, paragraph in enumerate(paragraphs):
+        if index in scene_at:
+            start, end = scenes[scene_at[index]]
+            lines.append(f"[{scene_at[index]} = P{start + 1}-P{end + 1}]")
+        lines.append(f"[P{index + 1}] {paragraph}")
+    return "\n\n".join(lines)
+
+
+def parse_edits(text):
+    """The list of edits in a model reply, tolerating code fences and prose around the JSON."""
+    text = final_answer(text or "")
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise PatchError("No JSON object in the reply")
+    try:
+        edits = json.loads(text[start:end + 1]).get("edits")
+    except (ValueError, AttributeError) as e:
+        raise PatchError(f"Unreadable edits: {e}") from e
+    if not isinstance(edits, list):
+        raise PatchError('The reply has no "edits" list')
+    return edits
+
+
+def apply_edits(paragraphs, edits, scenes=None):
+    """Apply scene/paragraph edits to `paragraphs`, all addressed by their original positions."""
+    scenes = scenes if scenes is not None else scene_ranges(paragraphs)
+    before = [[] for _ in paragraphs]
+    after = [[] for _ in paragraphs]
+    kept = [[paragraph] for paragraph in paragraphs]
+    touched = set()
+    for edit in edits:
+        if not isinstance(edit, dict) or edit.get("op") not in EDIT_OPS:
+            raise PatchError(f"Unknown edit {edit!r}")
+        target = str(edit.get("target", "")).strip().strip("[]").upper()
+        if target in scenes:
+            first, last = scenes[target]
+        elif re.fullmatch(r"P\d+", target) and 1 <= int(target[1:]) <= len(paragraphs):
+            first = last = int(target[1:]) - 1
+        else:
+            raise PatchError(f"Unknown target {target!r}")
+        text = edit.get("text") or ""
+        if not isinstance(text, str):
+            raise PatchError(f"{edit['op']} of {target} has a {type(text).__name__} instead of text")
+        text = text.strip()
+        if edit["op"] != "delete" and not text:
+            raise PatchError(f"{edit['op']} of {target} has no text")
+        if edit["op"] == "insert_before":
+            before[first].append(text)
+        elif edit["op"] == "insert_after":
+            after[last].append(text)
+        else:
+            span = set(range(first, last + 1))
+            if span & touched:
+                raise PatchError(f"{target} is edited twice")
+            touched |= span
+            for index in span:
+                kept[index] = []
+            if edit["op"] == "replace":
+                kept[first] = [text]
+    return [paragraph for index in range(len(paragraphs))
+            for paragraph in before[index] + kept[index] + after[index]]
+
+
+def request_edits(task, script, notes):
+    """Ask `task`'s agent for edits to `script` that address `notes`; returns (script, edits, reply tokens)."""
+    agent = task.agent
+    paragraphs = split_paragraphs(script)
+    scenes = scene_ranges(paragraphs)
+    prompt = (
+        f"You are {agent.role}.\n{agent.backstory}\n\nYour personal goal is: {agent.goal}\n\n"
+        f"Current Task: {task.description}\n\n{EDIT_INSTRUCTIONS}\n\n"
+        f"{CONTEXT_MARKER}\n{notes}\n\n# Draft\n{numbered(paragraphs, scenes)}"
+    )
+    reply = agent.llm.invoke(prompt).content
+    edits = parse_edits(reply)
+    return "\n\n".join(apply_edits(paragraphs, edits, scenes)), edits, count_tokens(reply)
+
+
+class ScriptReviser():
+    """Runner for the script task that revises the draft with scene/paragraph edits instead of a rewrite.
+
+    The writer sees the draft with numbered paragraphs and scenes plus the
+    critique, and answers with JSON edits that are applied locally. If the
+    edits can't be parsed or applied, the task falls back to the usual full
+    rewrite. With `rounds` > 1 the critic reviews the patched script again
+    and another set of edits is requested, until it has nothing left to say.
+    """
+
+    def __init__(self, draft_task, critique_task, rounds=1):
+        self.draft_task = draft_task
+        self.critique_task = critique_task
+        self.rounds = rounds
+        self.tokens_saved = 0
+
+    def _critique(self, script):
+        agent = self.critique_task.agent
+        prompt = (
+            f"You are {agent.role}.\n{agent.backstory}\n\nYour personal goal is: {agent.goal}\n\n"
+            f"Current Task: {self.critique_task.description}\n\n{CRITIQUE_INSTRUCTIONS}\n\n"
+            f"{CONTEXT_MARKER}\n{script}"
+        )
+        # Routed and accounted as the critique task, not the script task this runs under
+        with stage(current_run.get(), "critique", agent.role):
+            return final_answer(agent.llm.invoke(prompt).content)
+
+    def __call__(self, task, context):
+        script = getattr(getattr(self.draft_task, "output", None), "raw_output", None)
+        critique = getattr(getattr(self.critique_task, "output", None), "raw_output", None)
+        if not script or not critique:
+            return execute_task(task, context)
+
+        for round_number in range(1, self.rounds + 1):
+            if round_number > 1:
+                critique = self._critique(script)
+                if critique.strip().upper().startswith(NO_CHANGES):
+                    break
+            try:
+                script, edits, edit_tokens = request_edits(task, script, f"# Critique\n{critique}")
+            except PatchError as e:
+                self._log(task, round=round_number, fallback=round_number == 1, error=str(e))
+                if round_number > 1:
+                    # Keep what the earlier rounds achieved
+                    print(f"Revision round {round_number}: edits did not apply ({e}), "
+                          f"keeping round {round_number - 1}")
+                    break
+                print(f"Revision round {round_number}: edits did not apply ({e}), rewriting in full")
+                return execute_task(task, context)
+            rewrite_tokens = count_tokens(script)
+            self.tokens_saved += max(0, rewrite_tokens - edit_tokens)
+            self._log(task, round=round_number, edits=len(edits), output_tokens=edit_tokens,
+                      rewrite_tokens=rewrite_tokens, tokens_saved=max(0, rewrite_tokens - edit_tokens))
+            print(f"Revision round {round_number}: {len(edits)} edits in {edit_tokens} tokens "
+                  f"instead of a {rewrite_tokens}-token rewrite")
+
+        set_output(task, script)
+        if task.callback:
+            task.callback(task.output)
+        return script
+
+    @staticmethod
+    def _log(task, **record):
+        callback_logger.log(dict(record, run_id=current_run.get(), agent=getattr(task.agent, "role", None),
+                                 step="revision", task=current_task.get()))
+
+
+class ScriptGate():
+    """Runs a task, checks its script with analyzer.analyze() and fixes only what failed.
+
+    The checks are local and take well under a millisecond. When one
+    fails, the task's agent is sent the list of violations and asked for
+    edits to just those paragraphs, for up to `max_fixes` attempts. The
+    task callback (e.g. the sink) only sees the final text.
+    """
+
+    def __init__(self, run=execute_task, max_fixes=1, **checks):
+        self.run = run
+        self.max_fixes = max_fixes
+        self.checks = checks
+
+    @staticmethod
+    def notes(analysis):
+        lines = ["# Problems found by the script checker, fix only these"]
+        for violation in analysis.violations:
+            where = f" in P{violation.paragraph}" if violation.paragraph else ""
+            quoted = f" ({violation.text})" if violation.text else ""
+            lines.append(f"- {violation.rule}{where}: {violation.message}{quoted}")
+        return "\n".join(lines)
+
+    def __call__(self, task, context):
+        callback, task.callback = task.callback, None
+        try:
+            script = self.run(task, context)
+        finally:
+            task.callback = callback
+
+        analysis = analyze(script, **self.checks)
+        self._log(task, attempt=0, **analysis.summary())
+        for attempt in range(1, self.max_fixes + 1):
+            if analysis.ok:
+                break
+            try:
+                fixed, edits, _ = request_edits(task, script, self.notes(analysis))
+            except Exception as e:
+                # The task's output is already produced; a failed fix must not lose it
+                self._log(task, attempt=attempt, error=f"{type(e).__name__}: {e}")
+                break
+            fixed_analysis = analyze(fixed, **self.checks)
+            self._log(task, attempt=attempt, edits=len(edits), **fixed_analysis.summary())
+            if len(fixed_analysis.violations) > len(analysis.violations):
+                break
+            script, analysis = fixed, fixed_analysis
+        if not analysis.ok:
+            print(f"Script check for {current_task.get()}: {len(analysis.violations)} violations left "
+                  f"({', '.join(sorted({violation.rule for violation in analysis.violations}))})")
+
+        set_output(task, script)
+        if task.callback:
+            task.callback(task.output)
+        return script
+
+    @staticmethod
+    def _log(task, **record):
+        callback_logger.log(dict(record, run_id=current_run.get(), agent=getattr(task.agent, "role", None),
+                                 step="script_check", task=current_task.get()))
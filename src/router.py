@@ -0,0 +1,216 @@
+import contextvars
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, NamedTuple, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from metrics import current_run, current_task
+from ratelimit import limited_invoke
+from utils import callback_logger
+
+TIERS = ("fast", "balanced", "quality")
+
+
+class Route(NamedTuple):
+    provider: str
+    tier: str
+    input_price: float  # USD per million tokens
+    output_price: float
+    latency: float  # typical seconds for one of our calls
+
+
+CATALOG = {
+    "claude-3-haiku": Route("anthropic", "fast", 0.25, 1.25, 8.0),
+    "gpt-3.5-turbo": Route("openai", "fast", 0.5, 1.5, 10.0),
+    "claude-3-sonnet": Route("anthropic", "balanced", 3.0, 15.0, 20.0),
+    "claude-3-opus": Route("anthropic", "quality", 15.0, 75.0, 45.0),
+    "gpt-4": Route("openai", "quality", 30.0, 60.0, 40.0),
+}
+
+
+class Policy(NamedTuple):
+    tier: str = "balanced"  # lowest acceptable quality tier
+    latency_slo: Optional[float] = None  # seconds
+    max_output_price: Optional[float] = None  # USD per million output tokens
+    prefer: Optional[str] = None
+
+
+# Per-task overrides, picked up from the task currently running on this thread
+TASK_POLICIES = {
+    "imagine": Policy("fast", prefer="claude-3-haiku"),
+    "research": Policy("fast", prefer="claude-3-haiku"),
+    "outline": Policy("quality", prefer="claude-3-opus"),
+    "draft": Policy("quality", prefer="claude-3-opus"),
+    "critique": Policy("quality", prefer="gpt-4"),
+    "script": Policy("quality", prefer="claude-3-opus"),
+}
+
+HEDGE_POLL = 0.25  # seconds between checks whether the first request has been sent
+
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("SAGA_ROUTER_THREADS", "32")), thread_name_prefix="router")
+_hedging = {}  # run_id -> Counter of hedges and of the calls they left behind
+_hedging_lock = threading.Lock()
+
+
+def _count_hedging(**counts):
+    with _hedging_lock:
+        _hedging.setdefault(current_run.get(), Counter()).update(counts)
+
+
+def close_hedging(run_id):
+    """The run's hedging counters, or None if it never hedged.
+
+    `abandoned_sent` losers had already reached their provider and are
+    billed in full; `abandoned_unsent` ones were cancelled in the limiter.
+    """
+    with _hedging_lock:
+        counts = _hedging.pop(run_id, None)
+    return dict(counts) if counts else None
+
+
+def candidates(policy):
+    """Models that satisfy `policy`, preferred model first, then other providers, cheapest first."""
+    floor = TIERS.index(policy.tier)
+    names = [name for name, route in CATALOG.items() if TIERS.index(route.tier) >= floor]
+    if policy.max_output_price is not None:
+        names = [name for name in names if CATALOG[name].output_price <= policy.max_output_price] or names
+    if policy.latency_slo is not None:
+        names = [name for name in names if CATALOG[name].latency <= policy.latency_slo] or names
+    preferred = policy.prefer if policy.prefer in CATALOG else None
+    provider = CATALOG[preferred].provider if preferred else None
+    names.sort(key=lambda name: (name != preferred, CATALOG[name].provider == provider, CATALOG[name].output_price))
+    return names
+
+
+def should_fall_back(error):
+    """Timeouts, rate limits, overloads and connection failures are worth retrying elsewhere."""
+    if isinstance(error, TimeoutError):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429 or (isinstance(status, int) and status >= 500):
+        return True
+    name = type(error).__name__
+    return any(marker in name for marker in ("RateLimit", "Overloaded", "Timeout", "APIConnection"))
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model that picks a concrete model from llms.py per call and falls back on failure.
+
+    The policy comes from TASK_POLICIES for the running task, or `policy`
+    otherwise. Calls that time out or hit a 429/5xx move on to the next
+    candidate. A candidate whose rate limits keep it from sending within
+    `timeout` gives its reservation back and is skipped unsent; requests
+    that were sent are bounded by the client timeout (SAGA_REQUEST_TIMEOUT).
+    With `hedge_after` set, a second request goes to the next candidate once
+    the first has been with its provider that long, and whichever good
+    answer arrives first wins; losers still waiting for their limits are
+    cancelled unsent, the others are logged as "hedge_lost".
+    """
+
+    policy: Any = Policy()
+    timeout: Optional[float] = float(os.environ.get("SAGA_ROUTER_TIMEOUT", "180"))
+    hedge_after: Optional[float] = float(os.environ["SAGA_HEDGE_AFTER"]) if os.environ.get("SAGA_HEDGE_AFTER") else None
+    cache: Any = False  # the concrete models cache their own responses
+
+    @property
+    def _llm_type(self) -> str:
+        return "saga-router"
+
+    @property
+    def _identifying_params(self):
+        return {"policy": tuple(self.policy), "hedge_after": self.hedge_after}
+
+    def route(self):
+        return candidates(TASK_POLICIES.get(current_task.get(), self.policy))
+
+    def _submit(self, name, messages, stop, on_send=None, cancelled=None):
+        from llms import get_model, prepare_messages
+        model = get_model(name)
+        context = contextvars.copy_context()
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        return _pool.submit(context.run, limited_invoke, name, model, prepare_messages(name, messages),
+                            deadline=deadline, cancelled=cancelled, on_send=on_send, stop=stop)
+
+    def _log(self, **record):
+        callback_logger.log(dict(record, run_id=current_run.get(), task=current_task.get(), step="route"))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        names = self.route()
+        if self.hedge_after is not None:
+            message = self._hedged(names, messages, stop)
+        else:
+            message = self._with_fallback(names, messages, stop)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _with_fallback(self, names, messages, stop):
+        error = None
+        for name in names:
+            try:
+                return self._submit(name, messages, stop).result()
+            except Exception as e:
+                if not should_fall_back(e):
+                    raise
+                error = e
+                self._log(model=name, event="fallback", error=type(e).__name__)
+        raise error
+
+    def _hedged(self, names, messages, stop):
+        queue = list(names)
+        pending = {}
+        started = time.monotonic()
+        sent = {}  # name -> when its request first went to the provider
+        cancelled = threading.Event()
+        hedged = False
+        error = None
+
+        def launch():
+            name = queue.pop(0)
+
+            def on_send():
+                sent.setdefault(name, time.monotonic())
+            pending[self._submit(name, messages, stop, on_send, cancelled)] = name
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if not hedged and queue:
+                    # The hedge clock starts once a request is sent, not while it waits for its limits
+                    first = min(sent.values()) if sent else None
+                    timeout = max(0.0, first + self.hedge_after - time.monotonic()) if first else HEDGE_POLL
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    if sent and time.monotonic() >= min(sent.values()) + self.hedge_after:
+                        hedged = True
+                        _count_hedging(hedges=1)
+                        self._log(model=queue[0], event="hedge", after=round(time.monotonic() - started, 3))
+                        launch()
+                    continue
+                for future in done:
+                    name = pending.pop(future)
+                    try:
+                        message = future.result()
+                    except Exception as e:
+                        if not should_fall_back(e):
+                            raise
+                        error = e
+                        self._log(model=name, event="fallback", error=type(e).__name__)
+                        if queue:
+                            launch()
+                        continue
+                    if hedged:
+                        self._log(model=name, event="hedge_won", seconds=round(time.monotonic() - started, 3))
+                    return message
+            raise error or TimeoutError(f"No model answered: {names}")
+        finally:
+            # Losers still waiting in their limiter never send; the ones already sent run on and are billed
+            cancelled.set()
+            for name in pending.values():
+                billed = name in sent
+                _count_hedging(**{"abandoned_sent" if billed else "abandoned_unsent": 1})
+                self._log(model=name, event="hedge_lost", sent=billed)
@@ -0,0 +1,131 @@
+import contextvars
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import current_run, current_task
+from prompt_cache import CONTEXT_MARKER
+from ratelimit import limited_invoke
+from scheduler import execute_task, set_output
+from utils import callback_logger
+
+MAX_SCENES = 12
+STITCH_MODEL = "claude-3-haiku"
+
+SCENE_HEADING = re.compile(r"^\s*(?:#{1,6}\s*|[-*]\s+|\d+[.)]\s+)?(?:\*\*)?\s*(?:scene|section)\s*\d+\b", re.I)
+MARKDOWN_HEADING = re.compile(r"^#{1,3}\s+\S")
+TOP_LEVEL_ITEM = re.compile(r"^(?:\d+[.)]|[IVX]+\.)\s+\S")
+
+SCENE_INSTRUCTIONS = (
+    "The draft is being written one scene at a time, by several writers working in parallel from the same "
+    "brief and outline. Write ONLY the scene given at the end of this prompt: its voiceover narration and the "
+    "visual cues in brackets. Do not write an introduction, a conclusion, or any other scene."
+)
+STITCH_INSTRUCTIONS = (
+    "The YouTube narration script below was drafted scene by scene by different writers. Smooth it into one "
+    "continuous voiceover: fix the transitions between scenes, remove repetition across scene boundaries and "
+    "keep the tone consistent. Keep every scene, their order, their visual cues in brackets and their length; "
+    "change as little as possible. Return only the full script."
+)
+
+
+def _split(lines, pattern):
+    chunks = []
+    for line in lines:
+        if pattern.match(line):
+            chunks.append([line])
+        elif chunks:
+            chunks[-1].append(line)
+    return ["\n".join(chunk).strip() for chunk in chunks if "\n".join(chunk).strip()]
+
+
+def parse_scenes(outline, max_scenes=MAX_SCENES):
+    """Split an outline into one chunk of text per scene.
+
+    "Scene N" headings or items are used if there are at least two of them,
+    then markdown headings, then top-level numbered items. Text before the
+    first scene (the outline's title or logline) is dropped. Returns [] when
+    no split into two or more scenes is found. With more than `max_scenes`
+    scenes, neighbours are merged.
+    """
+    lines = (outline or "").splitlines()
+    for pattern in (SCENE_HEADING, MARKDOWN_HEADING, TOP_LEVEL_ITEM):
+        scenes = _split(lines, pattern)
+        if len(scenes) >= 2:
+            break
+    else:
+        return []
+    if len(scenes) > max_scenes:
+        size = -(-len(scenes) // max_scenes)
+        scenes = ["\n\n".join(scenes[index:index + size]) for index in range(0, len(scenes), size)]
+    return scenes
+
+
+def final_answer(text):
+    """Drop a ReAct-style "Thought: ... Final Answer:" preamble if the model added one."""
+    _, marker, answer = text.partition("Final Answer:")
+    return answer.strip() if marker else text.strip()
+
+
+class SceneDrafter():
+    """Runner for the draft task that writes every outline scene in its own concurrent call.
+
+    Each scene call gets the writer's role, the draft task's description and
+    the task context (brief and outline), and is asked for its share of
+    `total_words`. A cheap `stitch_model` pass then smooths the transitions.
+    If the outline can't be split into two or more scenes the task runs
+    the usual single completion.
+    """
+
+    def __init__(self, outline_task, total_words=600, stitch_model=STITCH_MODEL, max_scenes=MAX_SCENES, workers=None):
+        self.outline_task = outline_task
+        self.total_words = total_words
+        self.stitch_model = stitch_model
+        self.max_scenes = max_scenes
+        self.workers = workers
+
+    def _draft_scene(self, task, context, scenes, index, words):
+        agent = task.agent
+        prompt = (
+            f"You are {agent.role}.\n{agent.backstory}\n\nYour personal goal is: {agent.goal}\n\n"
+            f"Current Task: {task.description}\n\n{SCENE_INSTRUCTIONS}\n\n"
+            f"{CONTEXT_MARKER}\n{context}\n\n"
+            f"Scene {index + 1} of {len(scenes)}, about {words} words:\n{scenes[index]}"
+        )
+        return final_answer(agent.llm.invoke(prompt).content)
+
+    def stitch(self, drafts):
+        from llms import get_model
+        prompt = f"{STITCH_INSTRUCTIONS}\n\n" + "\n\n---\n\n".join(drafts)
+        return final_answer(limited_invoke(self.stitch_model, get_model(self.stitch_model), prompt).content)
+
+    def __call__(self, task, context):
+        outline = getattr(getattr(self.outline_task, "output", None), "raw_output", None)
+        scenes = parse_scenes(outline, self.max_scenes)
+        if len(scenes) < 2:
+            self._log(task, scenes=len(scenes), fallback=True)
+            return execute_task(task, context)
+
+        started = time.perf_counter()
+        words = max(40, self.total_words // len(scenes))
+        with ThreadPoolExecutor(max_workers=self.workers or len(scenes), thread_name_prefix="scene") as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._draft_scene, task, context, scenes, index, words)
+                for index in range(len(scenes))
+            ]
+            drafts = [future.result() for future in futures]
+        drafted = time.perf_counter()
+        result = self.stitch(drafts)
+        self._log(task, scenes=len(scenes), words_per_scene=words, draft_seconds=round(drafted - started, 3),
+                  stitch_seconds=round(time.perf_counter() - drafted, 3))
+        print(f"Drafted {len(scenes)} scenes in parallel ({drafted - started:.1f}s) and stitched them")
+
+        set_output(task, result)
+        if task.callback:
+            task.callback(task.output)
+        return result
+
+    @staticmethod
+    def _log(task, **record):
+        callback_logger.log(dict(record, run_id=current_run.get(), agent=getattr(task.agent, "role", None),
+                                 step="scenes", task=current_task.get()))
@@ -0,0 +1,182 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from crewai.tasks.task_output import TaskOutput
+
+from metrics import stage
+
+
+def set_output(task, result):
+    task.output = TaskOutput(
+        description=task.description,
+        exported_output=result,
+        raw_output=result,
+        agent=task.agent.role,
+    )
+
+
+def execute_task(task, context):
+    """Run a single crewai Task with an explicit context string, the way Task._execute does."""
+    result = task.agent.execute_task(task=task, context=context, tools=task.tools)
+    set_output(task, result)
+    if task.callback:
+        task.callback(task.output)
+    return result
+
+
+def join_context(name, task, parts):
+    return "\n".join(text for _, text in parts if text)
+
+
+class TaskGraph():
+    """A DAG of named Tasks built from their `.context` lists.
+
+    Every task whose upstream context is finished is started right away, so
+    stages that don't depend on each other run at the same time.
+    `context_builder(name, task, [(upstream name, output), ...])` turns the
+    upstream outputs into the context string handed to the task.
+    `runners` maps task names to a replacement for `execute(task, context)`.
+
+    With a `store` (checkpoint.RunStore) every finished task is persisted, and
+    a task whose saved output is still valid is restored instead of re-run:
+    its description must be unchanged and all of its upstream tasks must have
+    been restored too.
+
+    `seeded` maps task names to outputs computed elsewhere, e.g. by another
+    graph sharing the same upstream stages. Seeded tasks are not run and
+    count as restored.
+    """
+
+    def __init__(self, tasks, run_id=None, context_builder=join_context, store=None, runners=None, seeded=None):
+        self.tasks = dict(tasks)
+        self.seeded = dict(seeded or {})
+        self.runners = dict(runners or {})
+        self.run_id = run_id
+        self.context_builder = context_builder
+        self.store = store
+        self.restored = set()
+        names = {id(task): name for name, task in self.tasks.items()}
+        self.dependencies = {}
+        for name, task in self.tasks.items():
+            deps = []
+            for upstream in task.context or []:
+                if id(upstream) not in names:
+                    raise ValueError(f"Task {name!r} depends on a task that is not part of the graph")
+                deps.append(names[id(upstream)])
+            self.dependencies[name] = deps
+        self.durations = {}
+        self.outputs = {}
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                cycle = path[path.index(name):] + [name]
+                raise ValueError(f"Task dependencies form a cycle: {' -> '.join(cycle)}")
+            state[name] = "visiting"
+            for dep in self.dependencies[name]:
+                visit(dep, path + [name])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.tasks:
+            visit(name, [])
+        return order
+
+    def dependents(self, name):
+        return [other for other, deps in self.dependencies.items() if name in deps]
+
+    def context_for(self, name):
+        parts = [(dep, self.outputs.get(dep)) for dep in self.dependencies[name]]
+        return self.context_builder(name, self.tasks[name], parts)
+
+    def _restore(self, name):
+        if name in self.seeded:
+            set_output(self.tasks[name], self.seeded[name])
+            self.restored.add(name)
+            return self.seeded[name]
+        if self.store is None or not all(dep in self.restored for dep in self.dependencies[name]):
+            return None
+        saved = self.store.load_task(name, self.tasks[name])
+        if saved is None:
+            return None
+        set_output(self.tasks[name], saved["output"])
+        self.restored.add(name)
+        return saved["output"]
+
+    def _run_one(self, name, execute):
+        task = self.tasks[name]
+        started = time.perf_counter()
+        try:
+            restored = self._restore(name)
+            if restored is not None:
+                if name not in self.seeded:
+                    print(f"Restored {name} from checkpoint")
+                return restored
+            with stage(self.run_id, name, task.agent.role):
+                context = self.context_for(name)
+                output = self.runners.get(name, execute)(task, context)
+            if self.store is not None:
+                self.store.save_task(name, task, context, output)
+            return output
+        finally:
+            self.durations[name] = time.perf_counter() - started
+
+    def run_task(self, name, execute=execute_task):
+        """Run one task whose upstream tasks have finished, e.g. from an assembly.AssemblyLine worker."""
+        self.outputs[name] = self._run_one(name, execute)
+        return self.outputs[name]
+
+    def run(self, max_workers=None, execute=execute_task):
+        """Execute the graph, returning {task name: output}. The first failure aborts the run."""
+        remaining = {name: set(deps) for name, deps in self.dependencies.items()}
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers or len(self.tasks) or 1) as pool:
+            while remaining or running:
+                for name in [n for n in self.order if n in remaining and not remaining[n]]:
+                    del remaining[name]
+                    running[pool.submit(self._run_one, name, execute)] = name
+                if not running:
+                    raise RuntimeError(f"Tasks can never run: {sorted(remaining)}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.outputs[name] = future.result()
+                    except Exception:
+                        for pending in running:
+                            pending.cancel()
+                        raise
+                    for deps in remaining.values():
+                        deps.discard(name)
+        return self.outputs
+
+    def critical_path(self, durations=None):
+        """Return (task names, seconds) of the longest dependency chain.
+
+        Uses measured durations after a run; before one, every task counts as 1.
+        """
+        durations = durations or self.durations
+        finish = {}
+        previous = {}
+        for name in self.order:
+            start = 0.0
+            for dep in self.dependencies[name]:
+                if finish[dep] > start:
+                    start = finish[dep]
+                    previous[name] = dep
+            finish[name] = start + durations.get(name, 0.0 if durations else 1.0)
+        if not finish:
+            return [], 0.0
+        name = max(finish, key=finish.get)
+        total = finish[name]
+        path = [name]
+        while name in previous:
+            name = previous[name]
+            path.append(name)
+        return path[::-1], total
@@ -0,0 +1,233 @@
+import ast
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.tools import Tool
+
+MAX_DOCUMENT_CHARS = 1000
+NUM_RESULTS = 3
+
+
+class TTLCache():
+    """Small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=512, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+def parse_ids(ids):
+    """Accept ids as a list, a JSON/Python list literal, or a comma/space separated string. Never eval()s."""
+    if isinstance(ids, (list, tuple)):
+        return [str(i) for i in ids]
+    ids = str(ids).strip()
+    for parse in (json.loads, ast.literal_eval):
+        try:
+            value = parse(ids)
+        except (ValueError, SyntaxError):
+            continue
+        if isinstance(value, (list, tuple)):
+            return [str(i) for i in value]
+        if isinstance(value, str):
+            ids = value
+            break
+    return [part.strip("'\" []") for part in re.split(r"[,\s]+", ids) if part.strip("'\" []")]
+
+
+class ExaBackend():
+    """Exa search API with a single client shared by every call."""
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.environ.get("EXA_API_KEY")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from exa_py import Exa
+                    self._client = Exa(api_key=self.api_key)
+        return self._client
+
+    @staticmethod
+    def _hits(response):
+        return [{"id": r.id, "url": r.url, "title": getattr(r, "title", None)} for r in response.results]
+
+    def search(self, query, num_results):
+        return self._hits(self.client.search(query, use_autoprompt=True, num_results=num_results))
+
+    def find_similar(self, url, num_results):
+        return self._hits(self.client.find_similar(url, num_results=num_results))
+
+    def get_contents(self, document_id, max_chars):
+        # Exa truncates server side, so the full page never crosses the wire
+        response = self.client.get_contents([document_id], text={"max_characters": max_chars})
+        if not response.results:
+            return None
+        result = response.results[0]
+        return {"id": result.id, "url": result.url, "title": getattr(result, "title", None),
+                "text": (getattr(result, "text", None) or "")[:max_chars]}
+
+
+class CorpusBackend():
+    """Searches a local directory of .md/.txt/.json files, for offline runs, tests and benchmarks."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith((".md", ".txt", ".json")):
+                    path = os.path.join(root, name)
+                    document_id = os.path.relpath(path, directory)
+                    with open(path, encoding="utf-8", errors="replace") as document:
+                        # Titles and terms come from the head of the file, full text is only read on demand
+                        head = document.read(4000)
+                    self._index[document_id] = (head.strip().splitlines()[0][:120] if head.strip() else name,
+                                                Counter(self._terms(head)))
+
+    @staticmethod
+    def _terms(text):
+        return re.findall(r"[a-z0-9]{3,}", text.lower())
+
+    def _rank(self, terms, num_results, exclude=None):
+        scores = []
+        for document_id, (_, counts) in self._index.items():
+            if document_id == exclude:
+                continue
+            score = sum(counts[term] for term in terms)
+            if score:
+                scores.append((score, document_id))
+        scores.sort(reverse=True)
+        return [{"id": document_id, "url": f"file://{os.path.abspath(os.path.join(self.directory, document_id))}",
+                 "title": self._index[document_id][0]} for _, document_id in scores[:num_results]]
+
+    def search(self, query, num_results):
+        return self._rank(set(self._terms(query)), num_results)
+
+    def find_similar(self, url, num_results):
+        document_id = os.path.relpath(url.replace("file://", ""), os.path.abspath(self.directory))
+        if document_id not in self._index:
+            return []
+        terms = [term for term, _ in self._index[document_id][1].most_common(20)]
+        return self._rank(terms, num_results, exclude=document_id)
+
+    def get_contents(self, document_id, max_chars):
+        if document_id not in self._index:
+            return None
+        path = os.path.join(self.directory, document_id)
+        with open(path, encoding="utf-8", errors="replace") as document:
+            text = document.read(max_chars)
+        return {"id": document_id, "url": f"file://{os.path.abspath(path)}",
+                "title": self._index[document_id][0], "text": text}
+
+
+class ExaSearchTool():
+    """Search/find_similar/get_contents tools for the researcher agent over a pluggable backend.
+
+    Results are cached per query, url and document id; get_contents fetches
+    uncached ids concurrently and keeps at most `max_chars` per document.
+    """
+
+    def __init__(self, backend, cache=None, max_chars=MAX_DOCUMENT_CHARS, num_results=NUM_RESULTS, workers=8):
+        self.backend = backend
+        self.cache = cache or TTLCache()
+        self.max_chars = max_chars
+        self.num_results = num_results
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+
+    def _cached(self, key, fetch):
+        value = self.cache.get(key)
+        if value is None:
+            value = fetch()
+            if value is not None:
+                self.cache.set(key, value)
+        return value
+
+    @staticmethod
+    def _format_hits(hits):
+        if not hits:
+            return "No results."
+        return "\n".join(f"- id: {hit['id']}\n  url: {hit['url']}\n  title: {hit['title']}" for hit in hits)
+
+    def search(self, query: str):
+        """Search for a webpage based on the query"""
+        hits = self._cached(("search", query), lambda: self.backend.search(query, self.num_results))
+        return self._format_hits(hits)
+
+    def find_similar(self, url: str):
+        """Search for webpages similar to a given URL.
+        The url passed in should be a URL returned from `search`.
+        """
+        hits = self._cached(("similar", url.strip()), lambda: self.backend.find_similar(url.strip(), self.num_results))
+        return self._format_hits(hits)
+
+    def get_contents(self, ids: str):
+        """Get the contents of a webpage.
+        The ids must be passed in as a list, a list of ids returned from `search`.
+        """
+        ids = parse_ids(ids)
+        fetch = lambda document_id: self._cached(
+            ("contents", document_id, self.max_chars),
+            lambda: self.backend.get_contents(document_id, self.max_chars),
+        )
+        documents = list(self._pool.map(fetch, ids))
+        return "\n\n".join(
+            f"URL: {document['url']}\nTitle: {document['title']}\n{document['text'].strip()}"
+            for document in documents if document
+        ) or "No contents found."
+
+    def tools(self):
+        return [
+            Tool.from_function(func=self.search, name="search", description=self.search.__doc__),
+            Tool.from_function(func=self.find_similar, name="find_similar", description=self.find_similar.__doc__),
+            Tool.from_function(func=self.get_contents, name="get_contents", description=self.get_contents.__doc__),
+        ]
+
+
+_default_tool = None
+_default_lock = threading.Lock()
+
+
+def research_tools():
+    """Tools for the researcher: a local corpus if SAGA_RESEARCH_CORPUS is set, Exa if EXA_API_KEY is, else none."""
+    global _default_tool
+    with _default_lock:
+        if _default_tool is None:
+            corpus = os.environ.get("SAGA_RESEARCH_CORPUS")
+            if corpus:
+                _default_tool = ExaSearchTool(CorpusBackend(corpus))
+            elif os.environ.get("EXA_API_KEY"):
+                _default_tool = ExaSearchTool(ExaBackend())
+            else:
+                return []
+        return _default_tool.tools()
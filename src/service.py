@@ -0,0 +1,209 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+
+from utils import new_run_id
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class Job():
+    def __init__(self, concept):
+        self.run_id = new_run_id()
+        self.concept = concept
+        self.status = "queued"
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    def describe(self, with_result=False):
+        description = {
+            "id": self.run_id,
+            "concept": self.concept,
+            "status": self.status,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+        if with_result:
+            description["result"] = self.result
+        return description
+
+
+class JobService():
+    """Queue of concept jobs worked off by a fixed pool of pipeline workers in one long-lived process.
+
+    `run(concept, run_id=...)` runs one job on a worker thread. `warm_up` is
+    called once before the workers start, so imports, model clients and their
+    connection pools are in place for the first job and shared by all.
+    Submissions beyond `queue_size` pending jobs are refused so callers back
+    off instead of piling work up in memory. Finished jobs are kept for
+    polling until there are more than `keep` of them.
+    """
+
+    def __init__(self, run, workers=4, queue_size=100, keep=10000, warm_up=None):
+        self.run = run
+        self.warm_up = warm_up
+        self.workers = workers
+        self.keep = keep
+        self.jobs = OrderedDict()
+        self.queue = None
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._workers = []
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.warm_up:
+            started = time.perf_counter()
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.warm_up)
+            print(f"Warmed up in {time.perf_counter() - started:.1f}s")
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    def submit(self, concept):
+        """Queue a concept; raises asyncio.QueueFull when the queue is at capacity."""
+        job = Job(concept)
+        self.queue.put_nowait(job)
+        self.jobs[job.run_id] = job
+        self._evict()
+        return job
+
+    def _evict(self):
+        finished = [run_id for run_id, job in self.jobs.items() if job.finished]
+        for run_id in finished[:max(0, len(self.jobs) - self.keep)]:
+            del self.jobs[run_id]
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            job.status, job.started = "running", time.time()
+            try:
+                result = await loop.run_in_executor(self._executor, partial(self.run, job.concept, run_id=job.run_id))
+                job.status, job.result = "done", result if isinstance(result, dict) else str(result)
+            except Exception as e:
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+            finally:
+                job.finished = time.time()
+                self.queue.task_done()
+
+    def health(self):
+        statuses = [job.status for job in self.jobs.values()]
+        return {
+            "workers": self.workers,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.queue_size,
+            **{status: statuses.count(status) for status in ("queued", "running", "done", "failed")},
+        }
+
+    async def handle(self, method, path, body):
+        """Route one request; returns (status, payload, extra headers)."""
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        if method == "GET" and parts == ["health"]:
+            return HTTPStatus.OK, self.health(), {}
+        if parts[:1] != ["jobs"]:
+            return HTTPStatus.NOT_FOUND, {"error": f"No route for {path}"}, {}
+        if method == "POST" and len(parts) == 1:
+            return self._submit(body)
+        if method == "GET" and len(parts) == 1:
+            return HTTPStatus.OK, {"jobs": [job.describe() for job in self.jobs.values()]}, {}
+        job = self.jobs.get(parts[1]) if len(parts) > 1 else None
+        if method != "GET" or job is None or len(parts) > 3 or parts[2:] not in ([], ["result"]):
+            return HTTPStatus.NOT_FOUND, {"error": f"No job or route for {path}"}, {}
+        if parts[2:] == ["result"]:
+            if job.status == "done":
+                return HTTPStatus.OK, job.describe(with_result=True), {}
+            if job.status == "failed":
+                return HTTPStatus.INTERNAL_SERVER_ERROR, job.describe(), {}
+            return HTTPStatus.ACCEPTED, job.describe(), {"Retry-After": "30"}
+        return HTTPStatus.OK, job.describe(), {}
+
+    def _submit(self, body):
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {"error": "Body must be JSON"}, {}
+        usage = {"error": 'Send {"concept": "..."} or {"concepts": ["...", ...]}'}
+        if not isinstance(payload, dict):
+            return HTTPStatus.BAD_REQUEST, usage, {}
+        concepts = payload["concepts"] if "concepts" in payload else [payload.get("concept")]
+        if not isinstance(concepts, list) or not all(isinstance(concept, str) for concept in concepts):
+            return HTTPStatus.BAD_REQUEST, usage, {}
+        concepts = [concept.strip() for concept in concepts if concept.strip()]
+        if not concepts:
+            return HTTPStatus.BAD_REQUEST, usage, {}
+        if self.queue.maxsize and self.queue.qsize() + len(concepts) > self.queue.maxsize:
+            # Refuse the whole submission rather than queue part of it
+            return HTTPStatus.TOO_MANY_REQUESTS, {"error": "Queue is full", **self.health()}, {"Retry-After": "60"}
+        jobs = [self.submit(concept) for concept in concepts]
+        return HTTPStatus.ACCEPTED, {"jobs": [job.describe() for job in jobs], "queue_depth": self.queue.qsize()}, {}
+
+
+async def _read_request(reader):
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        return None
+    method, path, _ = request_line.split(" ", 2)
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path, body
+
+
+async def _respond(writer, status, payload, headers):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    head = [f"HTTP/1.1 {status.value} {status.phrase}", "Content-Type: application/json",
+            f"Content-Length: {len(body)}", "Connection: close"]
+    head += [f"{name}: {value}" for name, value in headers.items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(service, host="127.0.0.1", port=8000):
+    """Run the HTTP API until cancelled.
+
+    POST /jobs {"concept": ...} or {"concepts": [...]}  queue concepts, 429 when the queue is full
+    GET  /jobs/<id>, GET /jobs/<id>/result, GET /jobs   poll status and fetch scripts
+    GET  /health                                        queue depth and job counts
+    """
+    async def on_connection(reader, writer):
+        try:
+            request = await _read_request(reader)
+            if request is not None:
+                await _respond(writer, *await service.handle(*request))
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            await _respond(writer, HTTPStatus.BAD_REQUEST, {"error": str(e)}, {})
+        except Exception as e:
+            await _respond(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}, {})
+        finally:
+            writer.close()
+
+    await service.start()
+    server = await asyncio.start_server(on_connection, host, port)
+    print(f"Serving on http://{host}:{port} with {service.workers} workers, queue size {service.queue_size}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
@@ -0,0 +1,92 @@
+import json
+import os
+import re
+import sqlite3
+import uuid
+from datetime import datetime
+from threading import Lock
+
+from utils import atomic_write
+
+SINK_KINDS = ("markdown", "jsonl", "sqlite")
+
+
+def _slug(text, max_length=40):
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:max_length].rstrip("-") or "script"
+
+
+class MarkdownSink():
+    """One markdown file per script, named `{date}_{slug}_{id}.md` so runs never overwrite each other."""
+
+    def __init__(self, directory="."):
+        self.directory = directory
+
+    def write(self, concept, script):
+        created = datetime.now()
+        while True:
+            filename = f"{created:%Y-%m-%d}_{_slug(concept)}_{uuid.uuid4().hex[:8]}.md"
+            path = os.path.join(self.directory, filename)
+            if not os.path.exists(path):
+                break
+        atomic_write(path, script)
+        return path
+
+
+class JsonlSink():
+    """Appends one JSON record per script to a single file."""
+
+    def __init__(self, path="scripts.jsonl"):
+        self.path = path
+        self._lock = Lock()
+
+    def write(self, concept, script):
+        record_id = uuid.uuid4().hex
+        line = json.dumps({
+            "id": record_id,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "concept": concept,
+            "script": script,
+        }) + "\n"
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, "a") as jsonl_file:
+            jsonl_file.write(line)
+            jsonl_file.flush()
+            os.fsync(jsonl_file.fileno())
+        return f"{self.path}#{record_id}"
+
+
+class SqliteSink():
+    """Stores scripts as rows of a `scripts` table."""
+
+    def __init__(self, path="scripts.db"):
+        self.path = path
+        with sqlite3.connect(self.path) as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS scripts "
+                "(id TEXT PRIMARY KEY, created TEXT NOT NULL, concept TEXT NOT NULL, script TEXT NOT NULL)"
+            )
+
+    def write(self, concept, script):
+        record_id = uuid.uuid4().hex
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                connection.execute(
+                    "INSERT INTO scripts (id, created, concept, script) VALUES (?, ?, ?, ?)",
+                    (record_id, datetime.now().isoformat(timespec="seconds"), concept, script),
+                )
+        finally:
+            connection.close()
+        return f"{self.path}#{record_id}"
+
+
+def make_sink(kind="markdown", target=None):
+    if kind == "markdown":
+        return MarkdownSink(target or ".")
+    if kind == "jsonl":
+        return JsonlSink(target or "scripts.jsonl")
+    if kind == "sqlite":
+        return SqliteSink(target or "scripts.db")
+    raise ValueError(f"Unknown sink {kind!r}, expected one of {SINK_KINDS}")
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+from threading import Event, Lock
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import current_agent, current_run, current_task
+from utils import callback_logger, run_dir
+
+ABORT_FILE = "ABORT"
+
+
+class StreamAborted(RuntimeError):
+    """Raised from inside a generation when an operator aborts the run."""
+
+
+class StreamHandler(BaseCallbackHandler):
+    """Pushes streamed tokens to the console and to runs/<run_id>/stream/<task>.md as they arrive.
+
+    Progress is also sent to the callback logger every `log_every` characters.
+    A run is aborted mid-generation by `abort(run_id)` or by creating an ABORT
+    file in its run directory; the next token then raises StreamAborted so no
+    more output is paid for.
+    """
+
+    raise_error = True
+
+    def __init__(self, console=True, log_every=2000, check_every=0.5):
+        self.console = console
+        self.log_every = log_every
+        self.check_every = check_every
+        self._streams = {}
+        self._aborted = {}
+        self._lock = Lock()
+        self._console_lock = Lock()
+
+    def abort(self, run_id):
+        with self._lock:
+            self._aborted.setdefault(run_id, Event()).set()
+
+    def _should_abort(self, stream):
+        now = time.monotonic()
+        if now - stream["checked"] < self.check_every:
+            return False
+        stream["checked"] = now
+        event = self._aborted.get(stream["run_id"])
+        if event is not None and event.is_set():
+            return True
+        return stream["run_id"] is not None and os.path.exists(os.path.join(run_dir(stream["run_id"]), ABORT_FILE))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        saga_run = current_run.get()
+        task = current_task.get() or "unattributed"
+        directory = os.path.join(run_dir(saga_run), "stream") if saga_run else os.path.join("runs", "stream")
+        os.makedirs(directory, exist_ok=True)
+        stream = {
+            "run_id": saga_run,
+            "task": task,
+            "agent": current_agent.get(),
+            "file": open(os.path.join(directory, f"{task}.md"), "a", encoding="utf-8"),
+            "chars": 0,
+            "logged": 0,
+            "started": time.time(),
+            "checked": time.monotonic(),
+        }
+        with self._lock:
+            self._streams[run_id] = stream
+        if self.console:
+            with self._console_lock:
+                print(f"\n--- {stream['agent'] or task} ({task}) ---", flush=True)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self.on_chat_model_start(serialized, [], run_id=run_id)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        stream = self._streams.get(run_id)
+        if stream is None:
+            return
+        stream["file"].write(token)
+        stream["chars"] += len(token)
+        if self.console:
+            with self._console_lock:
+                sys.stdout.write(token)
+                sys.stdout.flush()
+        if "\n" in token:
+            stream["file"].flush()
+        if stream["chars"] - stream["logged"] >= self.log_every:
+            stream["logged"] = stream["chars"]
+            self._log(stream, "stream")
+        if self._should_abort(stream):
+            self._close(run_id, "aborted")
+            raise StreamAborted(f"Run {stream['run_id']} aborted during {stream['task']}")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._close(run_id, "stream_end")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._close(run_id, "stream_error")
+
+    def _close(self, run_id, step):
+        with self._lock:
+            stream = self._streams.pop(run_id, None)
+        if stream is None:
+            return
+        stream["file"].write("\n")
+        stream["file"].close()
+        self._log(stream, step)
+
+    def _log(self, stream, step):
+        callback_logger.log({
+            "run_id": stream["run_id"],
+            "agent": stream["agent"],
+            "task": stream["task"],
+            "step": step,
+            "chars": stream["chars"],
+            "elapsed": round(time.time() - stream["started"], 3),
+        })
+
+
+stream_handler = StreamHandler(console=os.environ.get("SAGA_STREAM_CONSOLE", "1") != "0")
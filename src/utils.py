@@ -1,39 +1,193 @@
+import atexit
+import itertools
 import json
-from typing import Union, List, Tuple, Dict
-from langchain.schema import AgentFinish
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import TYPE_CHECKING, Union, List, Tuple, Dict, Optional
 
-call_number = 0
-agent_finishes = []
+if TYPE_CHECKING:
+    from langchain.schema import AgentFinish
 
-def print_agent_output(agent_output: Union[str, List[Tuple[Dict, str]], AgentFinish], agent_name: str = 'Generic call'):
-    global call_number
-    call_number += 1
-    with open("crew_callback_logs.txt", "a") as log_file:
-        if isinstance(agent_output, str):
+LOG_PATH = os.environ.get("CALLBACK_LOG_PATH", "crew_callback_logs.jsonl")
+RUNS_DIR = os.environ.get("SAGA_RUNS_DIR", "runs")
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+def run_dir(run_id: str) -> str:
+    """Directory holding the artifacts of one run, created on demand."""
+    path = os.path.join(RUNS_DIR, run_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class CallbackLogger():
+    """Queue-backed JSONL logger for agent step callbacks.
+
+    `log()` only stamps the record and puts it on a queue; a daemon thread owns
+    the single open file handle, writes the lines and rotates the file once it
+    grows past `max_bytes`. Only the last `history_size` records are kept in
+    memory. If the queue is full the record is dropped and counted rather than
+    blocking the agent, and a record that can't be written (full disk, failed
+    rotation) is counted in `write_errors` while the thread keeps going.
+    """
+
+    def __init__(self, path: str = LOG_PATH, max_bytes: int = 10 * 1024 * 1024, backups: int = 3,
+                 history_size: int = 1000, queue_size: int = 10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.history = deque(maxlen=history_size)
+        self.dropped = 0
+        self.write_errors = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._seq = itertools.count(1)
+        self._seq_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._file = None
+
+    def log(self, record: Dict):
+        with self._seq_lock:
+            record["seq"] = next(self._seq)
+        record.setdefault("ts", time.time())
+        self.history.append(record)
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._drain, name="callback-logger", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _drain(self):
+        while True:
+            record = self._queue.get()
             try:
-                agent_output = json.loads(agent_output)
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error: {e}", file=log_file)
-
-        if isinstance(agent_output, list) and all(isinstance(item, tuple) for item in agent_output):
-            print(f"-{call_number}----Dict------------------------------------------", file=log_file)
-            for action, description in agent_output:
-                print(f"Agent Name: {agent_name}", file=log_file)
-                print(f"Tool used: {getattr(action, 'tool', 'Unknown')}", file=log_file)
-                print(f"Tool input: {getattr(action, 'tool_input', 'Unknown')}", file=log_file)
-                print(f"Action log: {getattr(action, 'log', 'Unknown')}", file=log_file)
-                print(f"Description: {description}", file=log_file)
-                print("--------------------------------------------------", file=log_file)
-
-        elif isinstance(agent_output, AgentFinish):
-            print(f"-{call_number}----AgentFinish---------------------------------------", file=log_file)
-            print(f"Agent Name: {agent_name}", file=log_file)
-            agent_finishes.append(agent_output)
-            output = getattr(agent_output, 'return_values', {})
-            print(f"AgentFinish Output: {output.get('output', 'No output available')}", file=log_file)
-            print("--------------------------------------------------", file=log_file)
+                if record is None:
+                    return
+                self._write(json.dumps(record, default=str) + "\n")
+                if self._queue.empty():
+                    self._file.flush()
+            except Exception as e:
+                self.write_errors += 1
+                if self.write_errors == 1:
+                    print(f"Callback log {self.path} not written: {type(e).__name__}: {e}", file=sys.stderr)
+                self._reset_file()
+            finally:
+                self._queue.task_done()
 
+    def _write(self, line: str):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(line)
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _reset_file(self):
+        """Drop the handle after a failed write so the next record reopens the log."""
+        try:
+            if self._file is not None:
+                self._file.close()
+        except OSError:
+            pass
+        self._file = None
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
         else:
-            print(f"-{call_number}-Unknown format of agent_output:", file=log_file)
-            print(type(agent_output), file=log_file)
-            print(agent_output, file=log_file)
\ No newline at end of file
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def flush(self):
+        """Block until everything queued so far is on disk."""
+        if self._thread is not None:
+            self._queue.join()
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+callback_logger = CallbackLogger()
+
+
+def agent_step_records(agent_output: Union[str, List[Tuple[Dict, str]], "AgentFinish"], agent_name: str,
+                       run_id: Optional[str] = None) -> List[Dict]:
+    """Turn a crewai step callback payload into flat, JSON-friendly records."""
+    from langchain.schema import AgentFinish
+    ts = time.time()
+    base = {"ts": ts, "run_id": run_id, "agent": agent_name}
+
+    if isinstance(agent_output, str):
+        try:
+            agent_output = json.loads(agent_output)
+        except json.JSONDecodeError:
+            pass
+
+    if isinstance(agent_output, list) and all(isinstance(item, tuple) for item in agent_output):
+        return [
+            dict(base,
+                 step="action",
+                 tool=getattr(action, "tool", None),
+                 tool_input=getattr(action, "tool_input", None),
+                 log=getattr(action, "log", None),
+                 observation=description)
+            for action, description in agent_output
+        ]
+
+    if isinstance(agent_output, AgentFinish):
+        output = getattr(agent_output, "return_values", {}) or {}
+        return [dict(base, step="finish", output=output.get("output"))]
+
+    return [dict(base, step="unknown", output_type=type(agent_output).__name__, output=agent_output)]
+
+
+def print_agent_output(agent_output: Union[str, List[Tuple[Dict, str]], "AgentFinish"], agent_name: str = 'Generic call',
+                       run_id: Optional[str] = None):
+    for record in agent_step_records(agent_output, agent_name, run_id):
+        callback_logger.log(record)
+
+
+def atomic_write(path: str, data: str):
+    """Write `data` to `path` so readers only ever see the old file or the complete new one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
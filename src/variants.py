@@ -0,0 +1,76 @@
+import json
+import os
+from typing import NamedTuple
+
+from analyzer import analyze
+from utils import atomic_write, run_dir
+
+SHARED_STAGES = ("imagine", "research")
+
+
+class Variant(NamedTuple):
+    name: str
+    tone: str
+    writers: str
+
+
+def parse_variants(specs, tone, writers):
+    """Variants from "TONE; WRITERS" strings; an empty part keeps the default `tone` or `writers`."""
+    variants = []
+    for number, spec in enumerate(specs, 1):
+        variant_tone, _, variant_writers = spec.partition(";")
+        variants.append(Variant(f"v{number}", variant_tone.strip() or tone, variant_writers.strip() or writers))
+    return variants
+
+
+def variant_run_id(run_id, variant):
+    return f"{run_id}-{variant.name}"
+
+
+def comparison(concept, run_id, shared_report, results, **checks):
+    """The comparison bundle: every variant's script next to its local analysis, cost and time.
+
+    `results` has one dict per variant with its script (or error), LLM
+    report and wall seconds. Costs of the shared stages are counted once.
+    """
+    variants = []
+    for variant, result in results:
+        entry = dict(variant._asdict(), run_id=variant_run_id(run_id, variant), seconds=result.get("seconds"),
+                     cost_usd=result["report"]["total"]["cost_usd"] if result.get("report") else None)
+        if result.get("error"):
+            entry["error"] = result["error"]
+        else:
+            analysis = analyze(result["script"], **checks)
+            summary = analysis.summary()
+            entry.update(words=summary["words"], spoken_seconds=summary["seconds"], cues=summary["cues"],
+                         violations=sorted({violation.rule for violation in analysis.violations}),
+                         script=result["script"])
+        variants.append(entry)
+    shared_cost = shared_report["total"]["cost_usd"]
+    return {
+        "concept": concept,
+        "run_id": run_id,
+        "shared": {"stages": list(SHARED_STAGES), "cost_usd": shared_cost},
+        "variants": variants,
+        "total_cost_usd": round(shared_cost + sum(entry["cost_usd"] or 0 for entry in variants), 6),
+    }
+
+
+def write_bundle(bundle):
+    path = os.path.join(run_dir(bundle["run_id"]), "variants.json")
+    atomic_write(path, json.dumps(bundle, indent=2))
+    return path
+
+
+def report(bundle):
+    lines = [f"{'variant':8} {'words':>6} {'spoken':>7} {'cost':>9} {'wall':>7}  violations / tone"]
+    for entry in bundle["variants"]:
+        if "error" in entry:
+            lines.append(f"{entry['name']:8} failed: {entry['error']}")
+            continue
+        lines.append(f"{entry['name']:8} {entry['words']:>6} {entry['spoken_seconds']:>6.0f}s "
+                     f"${entry['cost_usd'] or 0:>8.4f} {entry['seconds'] or 0:>6.1f}s  "
+                     f"{', '.join(entry['violations']) or 'ok'} / {entry['tone']}")
+    lines.append(f"shared {', '.join(bundle['shared']['stages'])}: ${bundle['shared']['cost_usd']:.4f}, "
+                 f"total ${bundle['total_cost_usd']:.4f}")
+    return lines